@@ -23,10 +23,37 @@ adOpenKeyset        = 1
 adOpenStatic        = 3
 adOpenUnspecified   = -1
 
+# LockTypeEnum
+adLockBatchOptimistic = 4
+adLockOptimistic      = 3
+adLockPessimistic     = 2
+adLockReadOnly        = 1
+adLockUnspecified     = -1
+
+# AffectEnum
+adAffectAll         = 3
+adAffectAllChapters = 4
+adAffectCurrent     = 1
+adAffectGroup       = 2
+
 # CommandTypeEnum
 adCmdText = 1
 adCmdStoredProc = 4
 
+# ExecuteOptionEnum
+adAsyncExecute          = 0x10
+adAsyncFetch            = 0x20
+adAsyncFetchNonBlocking = 0x40
+adExecuteNoRecords      = 0x80
+
+# StreamTypeEnum
+adTypeBinary = 1
+adTypeText   = 2
+
+# PersistFormatEnum
+adPersistADTG = 0
+adPersistXML  = 1
+
 # ParameterDirectionEnum
 adParamInput       = 1
 adParamInputOutput = 3
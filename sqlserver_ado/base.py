@@ -4,6 +4,10 @@ from django.db.backends.signals import connection_created
 from django.core.exceptions import ImproperlyConfigured
 
 import dbapi as Database
+import pool
+import stats
+import tags
+import workload
 
 from introspection import DatabaseIntrospection
 from creation import DatabaseCreation
@@ -127,13 +131,74 @@ class DatabaseWrapper(BaseDatabaseWrapper):
             self.command_timeout = int(self.settings_dict.get('COMMAND_TIMEOUT', 30))
         except ValueError:   
             self.command_timeout = 30
+
+        options = self.settings_dict.get('OPTIONS') or {}
+        try:
+            self.command_cache_size = int(options.get('command_cache_size', Database.defaultCommandCacheSize))
+        except ValueError:
+            raise ImproperlyConfigured("OPTIONS['command_cache_size'] must be a number.")
+
+        # Connections come from a process-level pool if OPTIONS['pool'] is set.
+        self.pool = None
+        pool_options = options.get('pool')
+        if pool_options:
+            if pool_options is True:
+                pool_options = {}
+            unknown = set(pool_options) - set(pool.defaults)
+            if unknown:
+                raise ImproperlyConfigured("Unknown OPTIONS['pool'] settings: %s" % ', '.join(sorted(unknown)))
+            connection_string = make_connection_string(self.settings_dict)
+            self.pool = pool.get_pool(
+                (connection_string, self.command_timeout, self.command_cache_size),
+                self._connect,
+                pool_options)
+
+        # Statement statistics are collected if OPTIONS['statement_stats'] is set.
+        self.statement_stats = None
+        stats_options = options.get('statement_stats')
+        if stats_options:
+            if stats_options is True:
+                stats_options = {}
+            unknown = set(stats_options) - set(stats.defaults)
+            if unknown:
+                raise ImproperlyConfigured("Unknown OPTIONS['statement_stats'] settings: %s" % ', '.join(sorted(unknown)))
+            self.statement_stats = stats.statement_stats
+            self.statement_stats.configure(**stats_options)
+
+        # Statements are prefixed with call-site comments if OPTIONS['tag_sql'] is set.
+        self.tag_sql = bool(options.get('tag_sql', False))
+
+        # Statements are appended to a workload file if OPTIONS['record_workload'] is set.
+        self.record_workload = options.get('record_workload')
+
+    def _connect(self):
+        connection = Database.connect(
+            make_connection_string(self.settings_dict),
+            self.command_timeout,
+            self.command_cache_size
+        )
+        if self.statement_stats is not None:
+            connection.add_listener(self.statement_stats)
+        if self.tag_sql:
+            connection.tagger = tags.tag_sql
+        if self.record_workload:
+            connection.recorder = workload.get_recorder(self.record_workload)
+        return connection
         
     def _cursor(self):
         if self.connection is None:
-            self.connection = Database.connect(
-                                make_connection_string(self.settings_dict),
-                                self.command_timeout
-                              )
+            if self.pool is not None:
+                self.connection = self.pool.checkout()
+            else:
+                self.connection = self._connect()
             connection_created.send(sender=self.__class__)
 
         return Database.Cursor(self.connection)
+
+    def close(self):
+        """Close the connection, or return it to the pool if pooling is enabled."""
+        if self.connection is not None and self.pool is not None:
+            self.pool.checkin(self.connection)
+            self.connection = None
+        else:
+            super(DatabaseWrapper, self).close()
@@ -0,0 +1,64 @@
+"""Evaluate several querysets in one round trip to the database.
+
+    from sqlserver_ado.batch import fetch_querysets
+
+    order, lines, totals = fetch_querysets(
+        Order.objects.filter(pk=order_id),
+        OrderLine.objects.filter(order=order_id),
+        OrderLine.objects.filter(order=order_id).values('product').annotate(Sum('total')),
+    )
+
+The SELECT statements of the querysets are sent as one T-SQL batch (see
+Cursor.execute_batch) and each result set is turned back into what iterating
+over its queryset would give: model instances, values dicts or tuples.
+The querysets themselves are left unevaluated.
+"""
+from django.db import connections
+from django.db.models.sql.constants import MULTI
+from django.db.models.sql.datastructures import EmptyResultSet
+
+
+def fetch_querysets(*querysets):
+    """Return a list with the results of each queryset, running them as one batch.
+
+    All querysets must use the same database.
+    """
+    if not querysets:
+        return []
+    aliases = set([qs.db for qs in querysets])
+    if len(aliases) > 1:
+        raise ValueError('fetch_querysets needs querysets of one database, got: %s' % ', '.join(sorted(aliases)))
+    connection = connections[aliases.pop()]
+
+    clones, statements = list(), list()
+    for qs in querysets:
+        clone = qs._clone()
+        compiler = clone.query.get_compiler(using=clone.db)
+        try:
+            sql, params = compiler.as_sql()
+        except EmptyResultSet:
+            compiler = None
+        else:
+            statements.append((sql, params))
+        clones.append((clone, compiler))
+
+    cursor = connection.cursor()
+    try:
+        rows = iter(cursor.execute_batch(statements))
+    finally:
+        cursor.close()
+
+    results = list()
+    for clone, compiler in clones:
+        if compiler is None:
+            results.append([])
+            continue
+        results.append(_iterate(clone, compiler, rows.next()))
+    return results
+
+def _iterate(queryset, compiler, rows):
+    """Iterate queryset over already fetched rows instead of querying the database."""
+    # QuerySet.iterator gets its rows from compiler.execute_sql, via results_iter.
+    compiler.execute_sql = lambda result_type=MULTI: iter([rows])
+    queryset.query.get_compiler = lambda using=None, connection=None: compiler
+    return list(queryset)
@@ -1,6 +1,8 @@
 from django.db.models.sql import compiler
 import re
 
+import tags
+
 # query_class returns the base class to use for Django queries.
 # The custom 'SqlServerQuery' class derives from django.db.models.sql.query.Query
 # which is passed in as "QueryClass" by Django itself.
@@ -50,6 +52,12 @@ class SQLCompiler(compiler.SQLCompiler):
         return row
 
     def as_sql(self, with_limits=True, with_col_aliases=False):
+        sql, params = self._as_sql(with_limits, with_col_aliases)
+        if getattr(self.connection, 'tag_sql', False) and self.query.model is not None:
+            sql = tags.model_comment(self.query.model) + sql
+        return sql, params
+
+    def _as_sql(self, with_limits=True, with_col_aliases=False):
         self._using_row_number = False
         
         # Get out of the way if we're not a select query or there's no limiting involved.
@@ -26,23 +26,53 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA
 DB-API 2.0 specification: http://www.python.org/dev/peps/pep-0249/
 """
 
+import os
 import sys
 import time
+import logging
 import datetime
 import re
+import math
+import array
+import threading
+import hashlib
+from collections import deque
+from itertools import imap, islice
+from bisect import bisect_left
+from timeit import default_timer
 
 try:
     import decimal
 except ImportError:
     from django.utils import _decimal as decimal
 
-from django.db.utils import IntegrityError as DjangoIntegrityError
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
-import pythoncom
-import win32com.client
+from django.db.utils import IntegrityError as DjangoIntegrityError
+from django.utils.datastructures import SortedDict
 
 from ado_consts import *
 
+# The COM layer: pywin32, or the in-process fake ADODB provider in fakeado
+# when SQLSERVER_ADO_COM=fake is set (see use_com_layer).
+if os.environ.get('SQLSERVER_ADO_COM') == 'fake':
+    from fakeado import pythoncom, win32com
+else:
+    import pythoncom
+    import win32com.client
+
+def use_com_layer(pythoncom_module, win32com_module):
+    """Extension: make the module use another COM layer, like fakeado's pythoncom and win32com.
+
+    Affects connections opened afterwards.
+    """
+    global pythoncom, win32com
+    pythoncom = pythoncom_module
+    win32com = win32com_module
+
 # DB API default values
 apilevel = '2.0'
 
@@ -61,9 +91,36 @@ defaultIsolationLevel = adXactReadCommitted
 # It may be one of the "adUse..." consts.
 defaultCursorLocation = adUseServer
 
+# Set defaultCommandCacheSize on module level before creating the connection.
+# It is the number of prepared ADODB.Command objects each connection keeps
+# for reuse by execute; 0 disables the cache.
+defaultCommandCacheSize = 0
+
+# Set this to a list of timing listeners to be added to every new connection,
+# see Connection.add_listener.
+defaultTimingListeners = []
+
+# Batch limits for executemany. SQL Server accepts at most 2100 parameters
+# per request and 1000 rows per VALUES clause.
+_max_batch_parameters = 2000
+_max_batch_rows = 1000
+_max_batch_statements = 500
+
+# Format markers in an operation: "%s" for a parameter, "%%" for a literal "%".
+_re_format_marker = re.compile(r'%[%s]')
+
+# A single INSERT whose VALUES clause holds nothing but parameters.
+_re_insert_values = re.compile(
+    r'^\s*(INSERT\s.+?\sVALUES)\s*(\(\s*%s(?:\s*,\s*%s)*\s*\))\s*$',
+    re.IGNORECASE | re.DOTALL)
+
+# Statements executemany may repeat in a multi-statement batch.
+_re_batchable_statement = re.compile(r'^\s*(?:INSERT|UPDATE|DELETE)\s', re.IGNORECASE)
+
 # Used for COM to Python date conversions.
 _ordinal_1899_12_31 = datetime.date(1899,12,31).toordinal()-1
 _milliseconds_per_day = 24*60*60*1000
+_ordinal_1970_01_01 = datetime.date(1970,1,1).toordinal()
 
 
 class MultiMap(object):
@@ -83,6 +140,115 @@ class MultiMap(object):
         return self.storage.get(key, self.default)
 
 
+class LRUCache(object):
+    """A mapping holding at most maxsize items, evicting the least recently used one.
+
+    Counts hits, misses and evictions for inspection. A maxsize of 0 disables
+    the cache: nothing is stored and every lookup misses.
+
+    sizeof -- Optional callable giving the size of a value; maxsize then
+        limits the total size instead of the number of items.
+    on_evict -- Optional callable, called with (key, value) for each item
+        evicted to make room.
+    """
+    # Positions in a link of the circular doubly linked list.
+    PREV, NEXT, KEY, VALUE, SIZE = 0, 1, 2, 3, 4
+
+    def __init__(self, maxsize, sizeof=None, on_evict=None):
+        self.maxsize = maxsize
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+        self.clear()
+
+    def clear(self):
+        """Remove all items and reset the counters."""
+        self._links = dict()
+        self._root = root = []
+        root[:] = [root, root, None, None, 0]
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._links)
+
+    def __contains__(self, key):
+        return key in self._links
+
+    def _unlink(self, link):
+        prev_link, next_link = link[self.PREV], link[self.NEXT]
+        prev_link[self.NEXT] = next_link
+        next_link[self.PREV] = prev_link
+
+    def _append(self, link):
+        # The most recently used item lives just before the root.
+        root = self._root
+        last = root[self.PREV]
+        link[self.PREV], link[self.NEXT] = last, root
+        last[self.NEXT] = root[self.PREV] = link
+
+    def get(self, key, default=None):
+        """Return the value for key, marking it as most recently used."""
+        link = self._links.get(key)
+        if link is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._unlink(link)
+        self._append(link)
+        return link[self.VALUE]
+
+    def put(self, key, value):
+        """Store value under key, evicting least recently used items to make room.
+
+        A value larger than maxsize on its own is not stored.
+        """
+        size = 1
+        if self.sizeof is not None:
+            size = self.sizeof(value)
+
+        self.pop(key)
+        if size > self.maxsize:
+            return
+
+        while self.total_size + size > self.maxsize:
+            oldest = self._root[self.NEXT]
+            self.pop(oldest[self.KEY])
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(oldest[self.KEY], oldest[self.VALUE])
+
+        link = [None, None, key, value, size]
+        self._links[key] = link
+        self._append(link)
+        self.total_size += size
+
+    def pop(self, key, default=None):
+        """Remove key and return its value, or default if it is not cached."""
+        link = self._links.pop(key, None)
+        if link is None:
+            return default
+        self._unlink(link)
+        self.total_size -= link[self.SIZE]
+        return link[self.VALUE]
+
+    def keys(self):
+        """Return the cached keys, least recently used first."""
+        keys = list()
+        root = self._root
+        link = root[self.NEXT]
+        while link is not root:
+            keys.append(link[self.KEY])
+            link = link[self.NEXT]
+        return keys
+
+    def stats(self):
+        """Return a dict of the cache's size and counters."""
+        return dict(size=len(self._links), total_size=self.total_size, maxsize=self.maxsize,
+            hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+
 def standardErrorHandler(connection, cursor, errorclass, errorvalue):
     err = (errorclass, errorvalue)
     connection.messages.append(err)
@@ -90,6 +256,16 @@ def standardErrorHandler(connection, cursor, errorclass, errorvalue):
         cursor.messages.append(err)
     raise errorclass(errorvalue)
 
+# Failures of workload recorders (see Connection.recorder) are logged here
+# instead of failing the statements they record.
+_recorder_log = logging.getLogger('sqlserver_ado.workload')
+
+def _call_recorder(method, *args):
+    try:
+        method(*args)
+    except Exception:
+        _recorder_log.exception('Workload recorder %r failed', method)
+
 
 class Error(StandardError): pass
 class Warning(StandardError): pass
@@ -112,30 +288,85 @@ class _DbType(object):
     def __ne__(self, other): return other not in self.values
 
 
-def connect(connection_string, timeout=30):
+def connect(connection_string, timeout=30, command_cache_size=None):
     """Connect to a database.
 
     connection_string -- An ADODB formatted connection string, see:
         http://www.connectionstrings.com/?carrier=sqlserver2005
     timeout -- A command timeout value, in seconds (default 30 seconds)
+    command_cache_size -- Number of prepared commands to keep for reuse
+        (default defaultCommandCacheSize)
     """
     try:
+        start = time.time()
         pythoncom.CoInitialize()
         c = win32com.client.Dispatch('ADODB.Connection')
         c.CommandTimeout = timeout
         c.ConnectionString = connection_string
         c.Open()
-        useTransactions = _use_transactions(c)
-        return Connection(c, useTransactions)
+        capabilities = _provider_capabilities(c, connection_string)
+        connection = Connection(c, capabilities['transaction_ddl'] > 0, command_cache_size)
+        connection.capabilities = dict(capabilities)
+        connection.connection_string = connection_string
+        connection.connect_time = time.time() - start
+        return connection
     except Exception, e:
         raise OperationalError(e, "Error opening connection: " + connection_string)
 
-def _use_transactions(c):
-    """Return True if the given ADODB.Connection supports transactions."""
+# Provider properties read once per (provider, connection string), as
+# capability name => (ADO property name, default value).
+_capability_properties = {
+    'transaction_ddl': ('Transaction DDL', 0),
+    'dbms_version': ('DBMS Version', None),
+    'mars': ('MARS Connection', False),
+    'packet_size': ('Packet Size', None),
+}
+
+_capabilities_cache = dict()
+_capabilities_lock = threading.Lock()
+
+def _provider_capabilities(c, connection_string):
+    """Return the capabilities dict for an open ADODB.Connection.
+
+    Scanning c.Properties means hundreds of COM calls, so the results are
+    cached per provider and connection string.
+    """
+    key = (c.Provider, connection_string)
+    _capabilities_lock.acquire()
+    try:
+        capabilities = _capabilities_cache.get(key)
+    finally:
+        _capabilities_lock.release()
+    if capabilities is not None:
+        return capabilities
+
+    by_property = dict([(prop, name) for name, (prop, default) in _capability_properties.iteritems()])
+    capabilities = dict([(name, default) for name, (prop, default) in _capability_properties.iteritems()])
     for prop in c.Properties:
-        if prop.Name == 'Transaction DDL':
-            return prop.Value > 0
-    return False
+        name = by_property.get(prop.Name)
+        if name is not None:
+            capabilities[name] = prop.Value
+    capabilities['mars'] = bool(capabilities['mars'])
+
+    _capabilities_lock.acquire()
+    try:
+        _capabilities_cache[key] = capabilities
+    finally:
+        _capabilities_lock.release()
+    return capabilities
+
+def invalidate_capabilities(connection_string=None):
+    """Forget cached provider capabilities for connection_string, or for all connections if None."""
+    _capabilities_lock.acquire()
+    try:
+        if connection_string is None:
+            _capabilities_cache.clear()
+            return
+        for key in _capabilities_cache.keys():
+            if key[1] == connection_string:
+                del _capabilities_cache[key]
+    finally:
+        _capabilities_lock.release()
 
 def format_parameters(parameters, show_value=False):
     """Format a collection of ADO Command Parameters.
@@ -163,6 +394,53 @@ def format_parameters(parameters, show_value=False):
 
     return '[' + ', '.join(desc) + ']'
 
+# Rewritten SQL produced by Cursor.execute, keyed by (operation, parameter mask).
+# Shared by all connections; set sql_rewrite_cache.maxsize to resize it.
+sql_rewrite_cache = LRUCache(500)
+_sql_rewrite_cache_lock = threading.Lock()
+
+# Only statements at least this long, or with at least this many parameters,
+# go through sql_rewrite_cache. Formatting a short statement is cheaper than
+# the locked cache lookup (see rewrite_operation* in tests/benchmarks/bench_dbapi.py).
+_rewrite_cache_min_length = 512
+_rewrite_cache_min_parameters = 16
+
+# SQL replacements for the parameter mask codes used by Cursor.execute.
+_mask_replacements = {'?': '?', 'N': 'NULL', 'E': "''"}
+
+def _rewrite_operation(operation, parameter_mask, cache=True):
+    """Replace the %s markers in operation with ?, NULL or '' as given by parameter_mask.
+
+    parameter_mask has one code per parameter: '?' for a bound parameter,
+    'N' for NULL and 'E' for an empty string. Results for long statements
+    are memoized in sql_rewrite_cache unless cache is False.
+    """
+    if not cache or (len(operation) < _rewrite_cache_min_length and
+            len(parameter_mask) < _rewrite_cache_min_parameters):
+        return operation % tuple([_mask_replacements[code] for code in parameter_mask])
+
+    key = (operation, parameter_mask)
+    _sql_rewrite_cache_lock.acquire()
+    try:
+        rewritten = sql_rewrite_cache.get(key)
+    finally:
+        _sql_rewrite_cache_lock.release()
+
+    if rewritten is None:
+        rewritten = operation % tuple([_mask_replacements[code] for code in parameter_mask])
+        _sql_rewrite_cache_lock.acquire()
+        try:
+            sql_rewrite_cache.put(key, rewritten)
+        finally:
+            _sql_rewrite_cache_lock.release()
+    return rewritten
+
+def _quote_name(name):
+    """Quote a table or column name with brackets, unless it is already quoted."""
+    if name.startswith('[') and name.endswith(']'):
+        return name
+    return '[%s]' % name
+
 def _configure_parameter(p, value):
     """Configure the given ADO Parameter 'p' with the Python 'value'."""
     if p.Direction not in [adParamInput, adParamInputOutput, adParamUnknown]:
@@ -203,13 +481,42 @@ def _configure_parameter(p, value):
 
 
 class Connection(object):
-    def __init__(self, adoConn, useTransactions=False):
+    def __init__(self, adoConn, useTransactions=False, command_cache_size=None):
         self.adoConn = adoConn
         self.errorhandler = None
         self.messages = []
         self.adoConn.CursorLocation = defaultCursorLocation
         self.supportsTransactions = useTransactions
 
+        # Extension: prepared ADODB.Command objects reused by Cursor.execute,
+        # keyed by (SQL text, tuple of ADO parameter types).
+        if command_cache_size is None:
+            command_cache_size = defaultCommandCacheSize
+        self.command_cache = LRUCache(command_cache_size)
+
+        # Set by connect: the provider capabilities dict (see _capability_properties),
+        # the seconds it took to open the connection and the connection string.
+        self.capabilities = None
+        self.connect_time = None
+        self.connection_string = None
+
+        # Extension: callables receiving a StatementTiming for every statement
+        # run through this connection's cursors, see add_listener.
+        self.listeners = list(defaultTimingListeners)
+
+        # Extension: a callable taking an operation and the parameters passed to
+        # Cursor.execute and returning the SQL to run, e.g. tags.tag_sql; None
+        # to run it unchanged.
+        self.tagger = None
+
+        # Extension: set to True to move informational messages (PRINT output,
+        # SET STATISTICS IO/TIME results) into cursor.messages and timings.
+        self.capture_messages = False
+
+        # Extension: an object recording the statements and transactions run
+        # on this connection, see workload.WorkloadRecorder; None to record nothing.
+        self.recorder = None
+
         if self.supportsTransactions:
             self.adoConn.IsolationLevel = defaultIsolationLevel
             self.adoConn.BeginTrans() # Disables autocommit per DBPAI
@@ -222,10 +529,21 @@ class Connection(object):
 
     def _close_connection(self):
         """Close the underlying ADO Connection object, rolling back an active transaction if supported."""
+        self.command_cache.clear()
         if self.supportsTransactions:
             self.adoConn.RollbackTrans()
         self.adoConn.Close()
 
+    def _ping(self):
+        """Run SELECT 1 on the ADO connection, bypassing the tagger, recorder and timing listeners."""
+        cmd = win32com.client.Dispatch("ADODB.Command")
+        cmd.ActiveConnection = self.adoConn
+        cmd.CommandTimeout = self.adoConn.CommandTimeout
+        cmd.CommandText = 'SELECT 1'
+        recordset = cmd.Execute()[0]
+        if recordset is not None and recordset.State != adStateClosed:
+            recordset.Close()
+
     def close(self):
         """Close the database connection."""
         self.messages = []
@@ -244,6 +562,8 @@ class Connection(object):
         self.messages = []
         if not self.supportsTransactions:
             return
+        if self.recorder is not None:
+            _call_recorder(self.recorder.transaction, self, 'commit', time.time())
 
         try:
             self.adoConn.CommitTrans()
@@ -260,6 +580,8 @@ class Connection(object):
         self.messages = []
         if not self.supportsTransactions:
             self._raiseConnectionError(NotSupportedError, None)
+        if self.recorder is not None:
+            _call_recorder(self.recorder.transaction, self, 'rollback', time.time())
 
         self.adoConn.RollbackTrans()
         if not(self.adoConn.Attributes & adXactAbortRetaining):
@@ -268,6 +590,18 @@ class Connection(object):
             #If not, we will have to start a new transaction by this command:
             self.adoConn.BeginTrans()
 
+    def add_listener(self, listener):
+        """Extension: call listener with a StatementTiming for each statement run on this connection.
+
+        The timing is reported once the statement's results have been read,
+        or when the cursor runs another statement or is closed.
+        """
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Extension: stop calling a listener added with add_listener."""
+        self.listeners.remove(listener)
+
     def cursor(self):
         """Return a new Cursor object using the current connection."""
         self.messages = []
@@ -327,15 +661,33 @@ class Cursor(object):
     # Arraysize specifies the number of rows to fetch at a time with fetchmany().
     arraysize = 1
 
+    # Extension: number of rows pulled from the recordset per GetRows call
+    # when iterating over the cursor.
+    itersize = 1000
+
     def __init__(self, connection):
         self.messages = []
         self.connection = connection
         self.rs = None
         self.description = None
         self.errorhandler = connection.errorhandler
+        # Rows already read from the recordset but not yet handed out.
+        self._buffer = deque()
+        # Per-column converters for the current recordset, see _column_decoder.
+        self._decoders = None
+        # StatementTiming of the current statement while the connection has listeners.
+        self._timing = None
 
     def __iter__(self):
-        return iter(self.fetchone, None)
+        """Iterate over the remaining rows, reading them from the recordset in blocks of itersize."""
+        self.messages = list()
+        buffer = self._buffer
+        while True:
+            if not buffer:
+                buffer.extend(self._fetch(self.itersize))
+                if not buffer:
+                    return
+            yield buffer.popleft()
         
     def __enter__(self):
         "Allow database cursors to be used with context managers."
@@ -352,10 +704,14 @@ class Cursor(object):
         eh(self.connection, self, errorclass, errorvalue)
 
     def _description_from_recordset(self, recordset):
+        # Rows buffered from a previous recordset are no longer valid.
+        self._buffer.clear()
+
     	# Abort if closed or no recordset.
         if (recordset is None) or (recordset.State == adStateClosed):
             self.rs = None
             self.description = None
+            self._decoders = None
             return
 
         # Since we use a forward-only cursor, rowcount will always return -1
@@ -372,11 +728,14 @@ class Cursor(object):
 
             desc.append( (f.Name, f.Type, display_size, f.DefinedSize, f.Precision, f.NumericScale, null_ok) )
         self.description = desc
+        self._decoders = [_column_decoder(column_desc[1]) for column_desc in desc]
 
     def close(self):
         """Close the cursor."""
         self.messages = []
+        self._finish_timing()
         self.connection = None
+        self._buffer.clear()
         if self.rs and self.rs.State != adStateClosed:
             self.rs.Close()
             self.rs = None
@@ -397,20 +756,72 @@ class Cursor(object):
         except:
             self._raiseCursorError(DatabaseError, None)
 
+    def _begin_timing(self, operation, parameters):
+        """Report the previous statement's timing and start timing operation, if anyone listens."""
+        if self._timing is not None:
+            self._finish_timing()
+        if self.connection is None or not self.connection.listeners:
+            return None
+        self._timing = StatementTiming(operation, parameters)
+        return self._timing
+
+    def _finish_timing(self):
+        timing, self._timing = self._timing, None
+        if timing is None or self.connection is None:
+            return
+        for listener in self.connection.listeners:
+            listener(timing)
+
     def _execute_command(self):
         # Sprocs may have an integer return value
         self.return_value = None
 
+        timing = self._timing
         try:
-            recordset = self.cmd.Execute()
+            if timing is None:
+                recordset = self.cmd.Execute()
+            else:
+                start = default_timer()
+                recordset = self.cmd.Execute()
+                timing.execute += default_timer() - start
+                timing.com_calls += 1
             self.rowcount = recordset[1]
             self._description_from_recordset(recordset[0])
         except Exception, e:
-            _message = ""
-            if hasattr(e, 'args'): _message += str(e.args)+"\n"
-            _message += "Command:\n%s\nParameters:\n%s" %  (self.cmd.CommandText, format_parameters(self.cmd.Parameters, True))
-            klass = self.connection._suggest_error_class()
-            self._raiseCursorError(klass, _message)
+            if timing is not None:
+                timing.error = True
+                self._finish_timing()
+            self._raise_command_error(e)
+            return None
+
+        if self.connection.capture_messages:
+            self._collect_messages()
+        if timing is not None and self.rs is None:
+            self._finish_timing()
+        return recordset[0]
+
+    def _collect_messages(self):
+        """Move informational messages from the ADO Errors collection to messages and the timing."""
+        errors = self.connection.adoConn.Errors
+        if not errors.Count:
+            return
+        timing = self._timing
+        for error in errors:
+            if error.Number < 0:
+                # A real error, left for _suggest_error_class.
+                return
+        for error in errors:
+            self.messages.append((Warning, error.Description))
+            if timing is not None:
+                timing.add_message(error.Description)
+        errors.Clear()
+
+    def _raise_command_error(self, e):
+        _message = ""
+        if hasattr(e, 'args'): _message += str(e.args)+"\n"
+        _message += "Command:\n%s\nParameters:\n%s" %  (self.cmd.CommandText, format_parameters(self.cmd.Parameters, True))
+        klass = self.connection._suggest_error_class()
+        self._raiseCursorError(klass, _message)
 
 
     def callproc(self, procname, parameters=None):
@@ -428,6 +839,15 @@ class Cursor(object):
         Extension: A "return_value" property may be set on the
         cursor if the sproc defines an integer return value.
         """
+        if self.connection is not None and self.connection.recorder is not None:
+            return self._recorded('callproc', procname, parameters, self._callproc)
+        return self._callproc(procname, parameters)
+
+    def _callproc(self, procname, parameters=None):
+        timing = self._begin_timing(procname, parameters)
+        if timing is not None:
+            start = default_timer()
+
         self._new_command(adCmdStoredProc)
         self.cmd.CommandText = procname
         self.cmd.Parameters.Refresh()
@@ -442,6 +862,9 @@ class Cursor(object):
 
             self._raiseCursorError(DataError, _message)
 
+        if timing is not None:
+            timing.bind += default_timer() - start
+            timing.com_calls += 6 + 2 * len(parameters or ())
         self._execute_command()
 
         p_return_value = self.cmd.Parameters(0)
@@ -456,30 +879,94 @@ class Cursor(object):
 
         Return value is not defined.
         """
-        self._new_command()
+        self._execute_hooked(operation, parameters, self._execute)
+
+    def _execute_hooked(self, operation, parameters, function):
+        """Return function(operation, parameters), applying the connection's tagger and recorder as execute does."""
+        if self.connection is not None and self.connection.tagger is not None:
+            operation = self.connection.tagger(operation, parameters)
+        if self.connection is not None and self.connection.recorder is not None:
+            return self._recorded('execute', operation, parameters, function)
+        return function(operation, parameters)
+
+    def _recorded(self, kind, operation, parameters, function):
+        """Return function(operation, parameters), reporting the call to the connection's recorder."""
+        recorder = self.connection.recorder
+        connection = self.connection
+        start = time.time()
+        try:
+            result = function(operation, parameters)
+        except:
+            exc_info = sys.exc_info()
+            _call_recorder(recorder.statement, connection, kind, operation, parameters, start, time.time() - start, True)
+            raise exc_info[0], exc_info[1], exc_info[2]
+        _call_recorder(recorder.statement, connection, kind, operation, parameters, start, time.time() - start, False)
+        return result
+
+    def _execute(self, operation, parameters=None, use_caches=True):
+        """Execute operation, returning the first ADO Recordset it produced.
 
+        use_caches -- Set to False for one-off statements that should not be
+            kept in the SQL rewrite and command caches.
+        """
+        timing = self._begin_timing(operation, parameters)
+        if timing is None:
+            self._prepare_command(operation, parameters, use_caches)
+        else:
+            start = default_timer()
+            timing.com_calls += self._prepare_command(operation, parameters, use_caches)
+            timing.bind += default_timer() - start
+        return self._execute_command()
+
+    def _prepare_command(self, operation, parameters=None, use_caches=True):
+        """Set self.cmd to a Command for operation, with parameters bound, ready to Execute.
+
+        Returns the approximate number of COM calls made.
+        """
+        self.messages = []
         if parameters is None:
             parameters = list()
 
-        parameter_replacements = list()
+        parameter_mask = list()
+        bound_parameters = list()
         for i, value in enumerate(parameters):
             if value is None:
-                parameter_replacements.append('NULL')
+                parameter_mask.append('N')
                 continue
                 
             if isinstance(value, basestring) and value == "":
-                parameter_replacements.append("''")
+                parameter_mask.append('E')
                 continue
 
             # Otherwise, process the non-NULL, non-empty string parameter.
-            parameter_replacements.append('?')
+            parameter_mask.append('?')
             try:
-                p = self.cmd.CreateParameter('p%i' % i, _ado_type(value))
+                ado_type = _ado_type(value)
             except KeyError:
                 _message = u'Failed to map python type "%s" to an ADO type' % (value.__class__.__name__,)
                 self._raiseCursorError(DataError, _message)
+            bound_parameters.append((i, value, ado_type))
+
+        # Replace params with ?, NULL or ''
+        if parameter_mask:
+            operation = _rewrite_operation(operation, ''.join(parameter_mask), use_caches)
+
+        cache_key = None
+        if use_caches:
+            cache_key = self._command_cache_key(operation, bound_parameters)
+        if cache_key is not None:
+            cmd = self.connection.command_cache.get(cache_key)
+            if cmd is not None:
+                self.cmd = cmd
+                self._rebind_parameters(bound_parameters)
+                return 2 * len(bound_parameters)
+
+        self._new_command()
+        for i, value, ado_type in bound_parameters:
+            try:
+                p = self.cmd.CreateParameter('p%i' % i, ado_type)
             except:    
-                _message = u'Creating Parameter p%i, %s' % (i, _ado_type(value))
+                _message = u'Creating Parameter p%i, %s' % (i, ado_type)
                 self._raiseCursorError(DataError, _message)
 
             try:
@@ -491,20 +978,99 @@ class Cursor(object):
 
                 self._raiseCursorError(DataError, _message)
 
-        # Replace params with ? or NULL
-        if parameter_replacements:
-            operation = operation % tuple(parameter_replacements)
-
         self.cmd.CommandText = operation
-        self._execute_command()
+        if cache_key is not None:
+            self.cmd.Prepared = True
+            self.connection.command_cache.put(cache_key, self.cmd)
+        # Command creation and setup, then CreateParameter, Value, Size and Append per parameter.
+        return 5 + 4 * len(bound_parameters)
+
+    def _command_cache_key(self, operation, bound_parameters):
+        """Return the command cache key for a statement, or None if it should not be cached.
+
+        Only parameterized statements are prepared. Binary parameters are
+        excluded, as AppendChunk on a reused parameter appends to the old value.
+        """
+        if not bound_parameters or self.connection is None:
+            return None
+        if not self.connection.command_cache.maxsize:
+            return None
+        ado_types = tuple([ado_type for i, value, ado_type in bound_parameters])
+        if adBinary in ado_types:
+            return None
+        return (operation, ado_types)
+
+    def _rebind_parameters(self, bound_parameters):
+        """Set new values on the parameters of a cached command."""
+        for p, (i, value, ado_type) in zip(tuple(self.cmd.Parameters), bound_parameters):
+            try:
+                _configure_parameter(p, value)
+            except:
+                _message = u'Converting Parameter %s: %s, %s\n' %\
+                    (p.Name, ado_type_name(p.Type), repr(value))
+
+                self._raiseCursorError(DataError, _message)
 
     def executemany(self, operation, seq_of_parameters):
-        """Execute the given command against all parameter sequences or mappings given in seq_of_parameters."""
+        """Execute the given command against all parameter sequences or mappings given in seq_of_parameters.
+
+        Extension: parameter sets are sent in batches instead of one round trip
+        each. A simple "INSERT ... VALUES (%s, ...)" is rewritten into multi-row
+        VALUES clauses; other single INSERT, UPDATE and DELETE statements are
+        repeated in a multi-statement batch. Anything else runs once per
+        parameter set.
+        """
+        if self.connection is not None and self.connection.recorder is not None:
+            seq_of_parameters = list(seq_of_parameters)
+            self._recorded('executemany', operation, seq_of_parameters, self._executemany)
+        else:
+            self._executemany(operation, seq_of_parameters)
+
+    def _executemany(self, operation, seq_of_parameters):
         self.messages = list()
+        marker_count = _re_format_marker.findall(operation).count('%s')
+
+        insert = _re_insert_values.match(operation)
+        if insert and marker_count:
+            batch_size = min(_max_batch_rows, _max_batch_parameters // marker_count)
+            execute_batch = lambda batch: self._execute_insert_batch(insert.group(1), insert.group(2), batch)
+        elif _re_batchable_statement.match(operation) and ';' not in operation:
+            batch_size = min(_max_batch_statements, _max_batch_parameters // max(marker_count, 1))
+            execute_batch = lambda batch: self._execute_statement_batch(operation, batch)
+        else:
+            batch_size = 0
+
+        if batch_size < 2:
+            return self._executemany_serially(operation, seq_of_parameters)
+
+        total_recordcount = 0
+        seq_of_parameters = iter(seq_of_parameters)
+        while True:
+            batch = list(islice(seq_of_parameters, batch_size))
+            if not batch:
+                break
+            for params in batch:
+                if len(params) != marker_count:
+                    _message = u'Expected %i parameters, got %i: %r' % (marker_count, len(params), params)
+                    self._raiseCursorError(ProgrammingError, _message)
+
+            rowcount = execute_batch(batch)
+
+            if rowcount == -1:
+                total_recordcount = -1
+
+            if total_recordcount != -1:
+                total_recordcount += rowcount
+
+        self._description_from_recordset(None)
+        self.rowcount = total_recordcount
+
+    def _executemany_serially(self, operation, seq_of_parameters):
+        """Execute operation once for each parameter set."""
         total_recordcount = 0
 
         for params in seq_of_parameters:
-            self.execute(operation, params)
+            self._execute(operation, params)
 
             if self.rowcount == -1:
                 total_recordcount = -1
@@ -514,32 +1080,300 @@ class Cursor(object):
 
         self.rowcount = total_recordcount
 
-    def _fetch(self, rows=None):
-        """Fetch rows from the current recordset.
+    def _execute_insert_batch(self, head, row_template, batch):
+        """Insert all rows in batch with a single multi-row VALUES clause, returning the rowcount."""
+        operation = '%s %s' % (head, ','.join([row_template] * len(batch)))
+        parameters = [value for params in batch for value in params]
+        self._execute(operation, parameters, False)
+        return self.rowcount
 
-        rows -- Number of rows to fetch, or None (default) to fetch all rows.
+    def _execute_statement_batch(self, operation, batch):
+        """Execute operation once per parameter set in a single T-SQL batch, returning the total rowcount."""
+        parameters = [value for params in batch for value in params]
+        recordset = self._execute(';\n'.join([operation] * len(batch)), parameters, False)
+
+        # Each statement reports its affected row count as a separate result.
+        total_recordcount = self.rowcount
+        try:
+            for i in xrange(1, len(batch)):
+                recordset, rowcount = recordset.NextRecordset()
+                if recordset is None:
+                    break
+                if rowcount == -1 or total_recordcount == -1:
+                    total_recordcount = -1
+                else:
+                    total_recordcount += rowcount
+        except Exception, e:
+            _message = ""
+            if hasattr(e, 'args'): _message += str(e.args)+"\n"
+            _message += "Command:\n%s" % (self.cmd.CommandText,)
+            klass = self.connection._suggest_error_class()
+            self._raiseCursorError(klass, _message)
+        return total_recordcount
+
+    def bulk_insert(self, table, columns, rows, batch_size=1000, table_lock=False,
+            identity_insert=False, progress=None):
+        """Extension: insert rows through a client-side, batch optimistic ADO Recordset.
+
+        Rows are added to the Recordset with AddNew and sent to the server
+        with one UpdateBatch call per batch. Only one batch is held in memory.
+
+        table -- Name of the table to insert into.
+        columns -- Sequence of column names, in the order of each row's values.
+        rows -- Iterable of value sequences, e.g. a generator.
+        batch_size -- Number of rows sent per UpdateBatch (default 1000).
+        table_lock -- Take an exclusive lock on the table, held until the
+            current transaction ends.
+        identity_insert -- Allow explicit values for an IDENTITY column.
+        progress -- Optional callable, called with the number of rows
+            inserted so far after each batch.
+
+        Returns the number of rows inserted, which is also set as rowcount.
         """
-        if self.connection is None or self.rs is None:
+        self.messages = list()
+        if self.connection is None:
             self._raiseCursorError(Error, None)
             return
 
+        quoted_table = _quote_name(table)
+        field_names = [unicode(c).strip('[]') for c in columns]
+        select = u'SELECT %s FROM %s WHERE 1=0' % (
+            ', '.join([_quote_name(c) for c in columns]), quoted_table)
+
+        if table_lock:
+            # The statement has to read the table for the lock to be taken.
+            self.execute(u'SELECT COUNT(*) FROM %s WITH (TABLOCKX, HOLDLOCK)' % quoted_table)
+        if identity_insert:
+            self.execute(u'SET IDENTITY_INSERT %s ON' % quoted_table)
+
+        total_recordcount = 0
+        try:
+            rows = iter(rows)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                self._insert_batch(select, field_names, batch)
+                total_recordcount += len(batch)
+                if progress is not None:
+                    progress(total_recordcount)
+        finally:
+            if identity_insert:
+                self.execute(u'SET IDENTITY_INSERT %s OFF' % quoted_table)
+
+        self._description_from_recordset(None)
+        self.rowcount = total_recordcount
+        return total_recordcount
+
+    def _insert_batch(self, select, field_names, batch):
+        """Add the rows in batch to an empty client-side Recordset and send them with UpdateBatch."""
+        try:
+            rs = win32com.client.Dispatch('ADODB.Recordset')
+            rs.CursorLocation = adUseClient
+            rs.Open(select, self.connection.adoConn, adOpenStatic, adLockBatchOptimistic, adCmdText)
+            try:
+                for row in batch:
+                    rs.AddNew(field_names, list(row))
+                rs.UpdateBatch(adAffectAll)
+            finally:
+                rs.Close()
+        except Exception, e:
+            _message = ""
+            if hasattr(e, 'args'): _message += str(e.args)+"\n"
+            _message += "Bulk insert:\n%s" % (select,)
+            klass = self.connection._suggest_error_class()
+            self._raiseCursorError(klass, _message)
+
+    def execute_batch(self, statements):
+        """Extension: run several queries in one T-SQL batch, returning a list of rows per query.
+
+        statements -- A sequence of (operation, parameters) pairs. Each
+            operation must produce exactly one result set, e.g. a SELECT.
+
+        The queries are sent in as few round trips as the batch limits allow.
+        Afterwards the cursor is positioned past the last result set. Each
+        round trip is tagged and recorded like one execute of the batch.
+        """
+        self.messages = []
+        results = list()
+        operations, batch_parameters = list(), list()
+        for operation, parameters in statements:
+            parameters = list(parameters or ())
+            if operations and (len(operations) >= _max_batch_statements or
+                    len(batch_parameters) + len(parameters) > _max_batch_parameters):
+                results.extend(self._execute_read_batch(operations, batch_parameters))
+                operations, batch_parameters = list(), list()
+            operations.append(operation.rstrip().rstrip(';'))
+            batch_parameters.extend(parameters)
+
+        if operations:
+            results.extend(self._execute_read_batch(operations, batch_parameters))
+        return results
+
+    def _execute_read_batch(self, operations, parameters):
+        """Run operations as one batch and fetch all rows of each of their result sets."""
+        def execute_uncached(operation, parameters):
+            return self._execute(operation, parameters, use_caches=False)
+        self._execute_hooked(';\n'.join(operations), parameters, execute_uncached)
+        results = list()
+        for i in xrange(len(operations)):
+            if i and not self.nextset():
+                self.rs = None
+            if self.rs is None:
+                self._raiseCursorError(ProgrammingError,
+                    u'Statement %i of the batch did not return a result set:\n%s' % (i, operations[i]))
+            results.append(self._fetch_buffered())
+        return results
+
+    def execute_cached(self, operation, parameters=None, ttl=None, cache=None):
+        """Extension: execute a read-only query, answering repeats from a result cache.
+
+        On a miss the query runs with a client-side cursor, and the disconnected
+        Recordset is persisted into the cache. On a hit the Recordset is
+        rehydrated from the cache without contacting the server. Either way the
+        rows are then read with the usual fetch methods.
+
+        ttl -- Seconds the result stays valid (default cache.default_ttl).
+        cache -- The ResultCache to use (default the module's result_cache).
+
+        Misses are tagged and recorded like execute; hits never reach the
+        server and are not recorded.
+        """
+        if cache is None:
+            cache = result_cache
+        if self.connection is None:
+            self._new_command()
+            return
+
+        key = (self.connection.connection_string, operation, tuple(parameters or ()))
+        data = cache.get(key)
+        if data is not None:
+            self.messages = []
+            try:
+                recordset = _recordset_from_adtg(data)
+            except Exception:
+                # Unreadable cache entry; run the query instead.
+                cache.invalidate(key)
+            else:
+                self._finish_timing()
+                self.rowcount = -1
+                self._description_from_recordset(recordset)
+                return
+
+        adoConn = self.connection.adoConn
+        cursor_location = adoConn.CursorLocation
+        adoConn.CursorLocation = adUseClient
+        try:
+            self._execute_hooked(operation, parameters, self._execute)
+        finally:
+            adoConn.CursorLocation = cursor_location
+
+        if self.rs is None:
+            return
+        try:
+            # Setting ActiveConnection to Nothing disconnects the Recordset.
+            self.rs.ActiveConnection = win32com.client.VARIANT(pythoncom.VT_DISPATCH, None)
+            data = _recordset_to_adtg(self.rs)
+            if not (self.rs.BOF and self.rs.EOF):
+                self.rs.MoveFirst()
+        except Exception, e:
+            self._raiseCursorError(InternalError, e)
+        cache.put(key, data, ttl)
+
+    def _get_rows(self, rows=None, finish_timing=True):
+        """Read rows from the current recordset as returned by GetRows, one sequence per column.
+
+        rows -- Number of rows to read, or None (default) to read all rows.
+        finish_timing -- If True (default), report the statement's timing
+            once the recordset has been read. Callers that time their own
+            work on the rows pass False and finish the timing themselves.
+
+        Returns None if there are no more rows.
+        """
+        if self.connection is None or self.rs is None:
+            self._raiseCursorError(Error, None)
+            return None
+
+        timing = self._timing
         if self.rs.State == adStateClosed or self.rs.BOF or self.rs.EOF:
-            if rows == 1: # fetchone returns None
-                return None
-            else: # fetchall and fetchmany return empty lists
-                return list()
+            if self.connection.capture_messages:
+                self._collect_messages()
+            if timing is not None:
+                self._finish_timing()
+            return None
+
+        if timing is None and not self.connection.capture_messages:
+            if rows:
+                return self.rs.GetRows(rows)
+            return self.rs.GetRows()
+
+        if timing is None:
+            ado_results = self.rs.GetRows(rows or -1)
+            if self.rs.EOF:
+                # Messages about a result set arrive once it has been read.
+                self._collect_messages()
+            return ado_results
 
+        start = default_timer()
         if rows:
             ado_results = self.rs.GetRows(rows)
         else:
             ado_results = self.rs.GetRows()
+        timing.fetch += default_timer() - start
+        timing.com_calls += 1
+        if ado_results:
+            timing.rows += len(ado_results[0])
+            timing.cells += len(ado_results[0]) * len(ado_results)
+        if self.rs.EOF:
+            if self.connection.capture_messages:
+                self._collect_messages()
+            if finish_timing:
+                self._finish_timing()
+        return ado_results
+
+    def _fetch(self, rows=None):
+        """Fetch rows from the current recordset, returning a sequence of row tuples.
+
+        rows -- Number of rows to fetch, or None (default) to fetch all rows.
+        """
+        ado_results = self._get_rows(rows, False)
+        if ado_results is None:
+            return list()
+
+        timing = self._timing
+        if timing is not None:
+            start = default_timer()
 
-        py_columns = list()
-        column_types = [column_desc[1] for column_desc in self.description]
-        for ado_type, column in zip(column_types, ado_results):
-            py_columns.append( [_convert_to_python(cell, ado_type) for cell in column] )
+        # GetRows returns columns; convert lazily and build the row tuples in one pass.
+        columns = [column if decode is None else decode(column)
+            for decode, column in zip(self._decoders, ado_results)]
+        rows = zip(*columns)
 
-        return tuple(zip(*py_columns))
+        if timing is not None:
+            timing.convert += default_timer() - start
+            if self.rs.EOF:
+                self._finish_timing()
+        return rows
+
+    def _fetch_buffered(self, rows=None):
+        """Fetch rows, taking buffered rows first and reading the rest from the recordset.
+
+        rows -- Number of rows to fetch, or None (default) to fetch all rows.
+        """
+        buffer = self._buffer
+        if rows is None:
+            results = list(buffer)
+            buffer.clear()
+            results.extend(self._fetch())
+            return results
+
+        if len(buffer) >= rows:
+            return [buffer.popleft() for i in xrange(rows)]
+
+        results = list(buffer)
+        buffer.clear()
+        results.extend(self._fetch(rows - len(results)))
+        return results
 
     def fetchone(self):
         """Fetch the next row of a query result set, returning a single sequence, or None when no more data is available.
@@ -548,6 +1382,8 @@ class Cursor(object):
         did not produce any result set or no call was issued yet.
         """
         self.messages = list()
+        if self._buffer:
+            return self._buffer.popleft()
         result = self._fetch(1)
         if result: # return record (not list of records)
             return result[0]
@@ -558,12 +1394,112 @@ class Cursor(object):
         self.messages = list()
         if size is None:
             size = self.arraysize
-        return self._fetch(size)
+        return self._fetch_buffered(size)
 
     def fetchall(self):
         """Fetch all remaining rows of a query result, returning them as a sequence of sequences."""
         self.messages = list()
-        return self._fetch()
+        return self._fetch_buffered()
+
+    def fetch_columns(self, size=None):
+        """Extension: fetch the next set of rows column-wise, without building row tuples.
+
+        size -- Number of rows to fetch, or None (default) to fetch all remaining rows.
+
+        Returns a SortedDict of column name => column values, in result column order.
+        Integer and floating point columns without NULLs are returned as array.array,
+        all other columns as lists.
+        """
+        self.messages = list()
+        buffer = self._buffer
+        if size is None or len(buffer) < size:
+            buffered = list(buffer)
+            buffer.clear()
+            if size is None:
+                ado_results = self._get_rows(None, False)
+            else:
+                ado_results = self._get_rows(size - len(buffered), False)
+        else:
+            buffered = [buffer.popleft() for i in xrange(size)]
+            ado_results = None
+
+        timing = self._timing
+        if timing is not None:
+            start = default_timer()
+
+        columns = SortedDict()
+        for i, column_desc in enumerate(self.description):
+            values = [row[i] for row in buffered]
+            if ado_results is not None:
+                decode = self._decoders[i]
+                if decode is None:
+                    values.extend(ado_results[i])
+                else:
+                    values.extend(decode(ado_results[i]))
+            columns[column_desc[0]] = _compact_column(column_desc[1], values)
+
+        if timing is not None:
+            timing.convert += default_timer() - start
+            if ado_results is not None and self.rs.EOF:
+                self._finish_timing()
+        return columns
+
+    def fetchnumpy(self, size=None):
+        """Extension: fetch the next set of rows into NumPy arrays, one per column.
+
+        size -- Number of rows to fetch, or None (default) to fetch all remaining rows.
+
+        Returns a SortedDict of column name => array, in result column order.
+        Numeric, boolean and date columns get typed arrays (see _numpy_dtypes),
+        other columns get object arrays. Nullable columns are returned as
+        masked arrays, masking the NULLs.
+        """
+        self.messages = list()
+        if numpy is None:
+            self._raiseCursorError(NotSupportedError, u'fetchnumpy requires NumPy.')
+
+        buffer = self._buffer
+        if size is None or len(buffer) < size:
+            buffered = list(buffer)
+            buffer.clear()
+        else:
+            buffered = [buffer.popleft() for i in xrange(size)]
+
+        if self.description is None:
+            self._raiseCursorError(Error, None)
+
+        capacity = self.itersize
+        if size is not None:
+            capacity = min(size, capacity)
+        columns = [_NumpyColumn(column_desc, max(capacity, len(buffered)))
+            for column_desc in self.description]
+
+        for i, column in enumerate(columns):
+            column.extend([row[i] for row in buffered], False)
+        fetched = len(buffered)
+
+        while size is None or fetched < size:
+            block_size = self.itersize
+            if size is not None:
+                block_size = min(block_size, size - fetched)
+            ado_results = self._get_rows(block_size, False)
+            if ado_results is None:
+                break
+            timing = self._timing
+            if timing is not None:
+                start = default_timer()
+            for column, variants in zip(columns, ado_results):
+                column.extend(variants, True)
+            fetched += len(ado_results[0])
+            if timing is not None:
+                timing.convert += default_timer() - start
+                if self.rs.EOF:
+                    self._finish_timing()
+
+        results = SortedDict()
+        for column_desc, column in zip(self.description, columns):
+            results[column_desc[0]] = column.finish()
+        return results
 
     def nextset(self):
         """Skip to the next available recordset, discarding any remaining rows from the current recordset.
@@ -577,6 +1513,8 @@ class Cursor(object):
             return None
 
         recordset = self.rs.NextRecordset()[0]
+        if self.connection.capture_messages:
+            self._collect_messages()
         if recordset is None:
             return None
             
@@ -586,6 +1524,420 @@ class Cursor(object):
     def setinputsizes(self, sizes): pass
     def setoutputsize(self, size, column=None): pass
 
+# SET STATISTICS IO and TIME messages, e.g.
+#   Table 'Orders'. Scan count 1, logical reads 20, physical reads 0, read-ahead reads 0, ...
+#   SQL Server Execution Times:\n   CPU time = 0 ms,  elapsed time = 1 ms.
+_re_statistics_io = re.compile(r"^Table '([^']*)'\. (.*)$", re.DOTALL)
+_re_statistics_io_counter = re.compile(r'([a-zA-Z -]+?) (\d+)')
+_re_statistics_time = re.compile(
+    r'(SQL Server Execution Times|SQL Server parse and compile time):\s*'
+    r'CPU time = (\d+) ms,\s*elapsed time = (\d+) ms')
+
+class StatementTiming(object):
+    """Extension: wall times and counts for one statement, as reported to timing listeners.
+
+    operation -- The SQL (or procedure name) as passed to the cursor.
+    parameter_count -- Number of parameters passed.
+    bind -- Seconds spent creating the Command and binding parameters.
+    execute -- Seconds spent in Command.Execute.
+    fetch -- Seconds spent in Recordset.GetRows.
+    convert -- Seconds spent converting values and building rows.
+    rows, cells -- Number of rows and values fetched.
+    com_calls -- Approximate number of COM calls made.
+    error -- True if the statement failed.
+
+    With Connection.capture_messages set, also:
+    messages -- The informational messages of the statement.
+    io -- A dict of table => dict of SET STATISTICS IO counters, such as
+        scan_count, logical_reads and physical_reads.
+    server_cpu_ms, server_elapsed_ms -- Execution times from SET STATISTICS TIME.
+    compile_cpu_ms, compile_elapsed_ms -- Parse and compile times from SET STATISTICS TIME.
+    """
+    __slots__ = ('operation', 'parameter_count', 'bind', 'execute', 'fetch', 'convert',
+        'rows', 'cells', 'com_calls', 'error', 'messages', 'io',
+        'server_cpu_ms', 'server_elapsed_ms', 'compile_cpu_ms', 'compile_elapsed_ms')
+
+    def __init__(self, operation, parameters=None):
+        self.operation = operation
+        self.parameter_count = len(parameters or ())
+        self.bind = self.execute = self.fetch = self.convert = 0.0
+        self.rows = self.cells = self.com_calls = 0
+        self.error = False
+        self.messages = None
+        self.io = None
+        self.server_cpu_ms = self.server_elapsed_ms = None
+        self.compile_cpu_ms = self.compile_elapsed_ms = None
+
+    def add_message(self, message):
+        """Record an informational message, reading SET STATISTICS IO and TIME output."""
+        if self.messages is None:
+            self.messages = list()
+        self.messages.append(message)
+
+        match = _re_statistics_io.match(message)
+        if match is not None:
+            if self.io is None:
+                self.io = dict()
+            counters = self.io.setdefault(match.group(1), dict())
+            for name, value in _re_statistics_io_counter.findall(match.group(2)):
+                name = name.strip().lower().replace(' ', '_').replace('-', '_')
+                counters[name] = counters.get(name, 0) + int(value)
+            return
+
+        match = _re_statistics_time.search(message)
+        if match is not None:
+            cpu, elapsed = int(match.group(2)), int(match.group(3))
+            if match.group(1).startswith('SQL Server Execution'):
+                self.server_cpu_ms = (self.server_cpu_ms or 0) + cpu
+                self.server_elapsed_ms = (self.server_elapsed_ms or 0) + elapsed
+            else:
+                self.compile_cpu_ms = (self.compile_cpu_ms or 0) + cpu
+                self.compile_elapsed_ms = (self.compile_elapsed_ms or 0) + elapsed
+
+    @property
+    def total(self):
+        return self.bind + self.execute + self.fetch + self.convert
+
+    def __repr__(self):
+        return '<StatementTiming %.6fs bind=%.6f execute=%.6f fetch=%.6f convert=%.6f rows=%i: %r>' % (
+            self.total, self.bind, self.execute, self.fetch, self.convert, self.rows, self.operation[:60])
+
+
+class TimingHistogram(object):
+    """Extension: a timing listener aggregating StatementTimings per statement.
+
+        histogram = TimingHistogram()
+        connection.add_listener(histogram)
+        ...
+        histogram.stats()
+
+    buckets -- Ascending upper bounds, in seconds, of the total time histogram
+        buckets. A last bucket counts the slower statements.
+    max_statements -- Number of distinct statements to keep; the least
+        recently run are dropped beyond it.
+    """
+    default_buckets = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+    def __init__(self, buckets=None, max_statements=1000):
+        if buckets is None:
+            buckets = self.default_buckets
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._statements = LRUCache(max_statements)
+
+    def __call__(self, timing):
+        self._lock.acquire()
+        try:
+            stats = self._statements.get(timing.operation)
+            if stats is None:
+                stats = dict(calls=0, errors=0, rows=0, cells=0, com_calls=0,
+                    bind=0.0, execute=0.0, fetch=0.0, convert=0.0, total=0.0, max=0.0,
+                    histogram=[0] * (len(self.buckets) + 1))
+                self._statements.put(timing.operation, stats)
+            total = timing.total
+            stats['calls'] += 1
+            stats['errors'] += timing.error
+            stats['rows'] += timing.rows
+            stats['cells'] += timing.cells
+            stats['com_calls'] += timing.com_calls
+            stats['bind'] += timing.bind
+            stats['execute'] += timing.execute
+            stats['fetch'] += timing.fetch
+            stats['convert'] += timing.convert
+            stats['total'] += total
+            stats['max'] = max(stats['max'], total)
+            stats['histogram'][bisect_left(self.buckets, total)] += 1
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dict of statement => dict of its counters, phase time totals and histogram."""
+        self._lock.acquire()
+        try:
+            results = dict()
+            for operation in self._statements.keys():
+                stats = dict(self._statements.get(operation))
+                stats['histogram'] = list(stats['histogram'])
+                results[operation] = stats
+            return results
+        finally:
+            self._lock.release()
+
+    def percentile(self, operation, percent):
+        """Estimate a percentile of operation's total time, as the upper bound of its bucket.
+
+        Returns None for unknown statements and infinity in the last bucket.
+        """
+        self._lock.acquire()
+        try:
+            stats = self._statements.get(operation)
+            if stats is None:
+                return None
+            wanted = stats['calls'] * percent / 100.0
+            seen = 0
+            for bound, count in zip(self.buckets + (float('inf'),), stats['histogram']):
+                seen += count
+                if count and seen >= wanted:
+                    return bound
+            return float('inf')
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._statements.clear()
+        finally:
+            self._lock.release()
+
+
+class AsyncCursor(Cursor):
+    """Extension: a cursor running statements with ADO asynchronous execution.
+
+    execute_async starts a statement and returns at once. Poll done() for its
+    completion, e.g. from an event loop timer, or block in wait(). The fetch
+    methods wait for a running statement to finish first, and cancel() stops
+    it on the server. ADO objects belong to the COM apartment of the thread
+    that created them, so poll from the thread that owns the connection.
+    """
+    # Seconds between State checks in wait().
+    poll_interval = 0.01
+
+    def __init__(self, connection):
+        Cursor.__init__(self, connection)
+        # Recordset of the running statement, until done() sees it finish.
+        self._pending = None
+
+    def execute_async(self, operation, parameters=None):
+        """Start executing a database operation, without waiting for it to finish.
+
+        A statement still running on this cursor is waited for first.
+        """
+        self.wait()
+        self._finish_timing()
+        self._prepare_command(operation, parameters, use_caches=False)
+        self.return_value = None
+        self.rowcount = -1
+        self._description_from_recordset(None)
+        try:
+            result = self.cmd.Execute(pythoncom.Missing, pythoncom.Missing,
+                adCmdText | adAsyncExecute)
+        except Exception, e:
+            self._raise_command_error(e)
+        self._pending = result[0]
+
+    def done(self):
+        """Return True if no statement is running, reading its results if it just finished."""
+        if self._pending is None:
+            return True
+
+        try:
+            if self.cmd.State & (adStateConnecting | adStateExecuting):
+                return False
+        except Exception, e:
+            self._pending = None
+            self._raiseCursorError(OperationalError, e)
+
+        recordset, self._pending = self._pending, None
+        # Failures of an asynchronous statement only show in the Errors collection.
+        for error in self.connection.adoConn.Errors:
+            if error.Number < 0:
+                self._raise_command_error(Exception(error.Description))
+        self._description_from_recordset(recordset)
+        return True
+
+    def wait(self, timeout=None):
+        """Block until the running statement finishes.
+
+        Returns False if it is still running after timeout seconds, else True.
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while not self.done():
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def cancel(self):
+        """Cancel the running statement, if any."""
+        if self._pending is None:
+            return
+        self._pending = None
+        try:
+            self.cmd.Cancel()
+        except Exception, e:
+            self._raiseCursorError(OperationalError, e)
+        self._description_from_recordset(None)
+
+    def close(self):
+        self.cancel()
+        Cursor.close(self)
+
+    def __iter__(self):
+        self.wait()
+        return Cursor.__iter__(self)
+
+    def fetchone(self):
+        self.wait()
+        return Cursor.fetchone(self)
+
+    def fetchmany(self, size=None):
+        self.wait()
+        return Cursor.fetchmany(self, size)
+
+    def fetchall(self):
+        self.wait()
+        return Cursor.fetchall(self)
+
+    def fetch_columns(self, size=None):
+        self.wait()
+        return Cursor.fetch_columns(self, size)
+
+    def fetchnumpy(self, size=None):
+        self.wait()
+        return Cursor.fetchnumpy(self, size)
+
+    def nextset(self):
+        self.wait()
+        return Cursor.nextset(self)
+
+def _recordset_to_adtg(recordset):
+    """Return an ADO Recordset persisted in ADTG format, as a string of bytes."""
+    stream = win32com.client.Dispatch('ADODB.Stream')
+    stream.Type = adTypeBinary
+    stream.Open()
+    try:
+        recordset.Save(stream, adPersistADTG)
+        stream.Position = 0
+        return str(stream.Read())
+    finally:
+        stream.Close()
+
+def _recordset_from_adtg(data):
+    """Rehydrate a disconnected ADO Recordset from ADTG bytes made by _recordset_to_adtg."""
+    stream = win32com.client.Dispatch('ADODB.Stream')
+    stream.Type = adTypeBinary
+    stream.Open()
+    try:
+        stream.Write(buffer(data))
+        stream.Position = 0
+        recordset = win32com.client.Dispatch('ADODB.Recordset')
+        recordset.Open(stream)
+        return recordset
+    finally:
+        stream.Close()
+
+
+class ResultCache(object):
+    """Query results for Cursor.execute_cached, kept as persisted ADO Recordsets.
+
+    max_bytes -- Upper bound on the stored ADTG data. The least recently used
+        results are evicted to stay under it.
+    default_ttl -- Seconds a result stays valid when no ttl is given.
+    directory -- Optional directory to keep the results in as files, instead
+        of keeping them in memory.
+    """
+    def __init__(self, max_bytes=16*1024*1024, default_ttl=300, directory=None):
+        self.default_ttl = default_ttl
+        self.directory = directory
+        self.expirations = 0
+        self._lock = threading.Lock()
+        # key => (expiry time, ADTG bytes or file path, size in bytes)
+        self._entries = LRUCache(max_bytes, sizeof=lambda entry: entry[2], on_evict=self._evicted)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key)).hexdigest() + '.adtg')
+
+    def _evicted(self, key, entry):
+        if self.directory is not None:
+            try:
+                os.remove(entry[1])
+            except OSError:
+                pass
+
+    def get(self, key):
+        """Return the ADTG bytes cached for key, or None if missing or expired."""
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._entries.pop(key)
+                self._entries.hits -= 1
+                self._entries.misses += 1
+                self.expirations += 1
+                self._evicted(key, entry)
+                return None
+        finally:
+            self._lock.release()
+
+        if self.directory is None:
+            return entry[1]
+        try:
+            f = open(entry[1], 'rb')
+            try:
+                return f.read()
+            finally:
+                f.close()
+        except IOError:
+            self.invalidate(key)
+            return None
+
+    def put(self, key, data, ttl=None):
+        """Cache the ADTG bytes data for key, valid for ttl seconds (default default_ttl)."""
+        if ttl is None:
+            ttl = self.default_ttl
+        if len(data) > self._entries.maxsize:
+            return
+
+        value = data
+        if self.directory is not None:
+            value = self._path(key)
+            f = open(value, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+
+        self._lock.acquire()
+        try:
+            self._entries.put(key, (time.time() + ttl, value, len(data)))
+        finally:
+            self._lock.release()
+
+    def invalidate(self, key=None):
+        """Drop the result cached for key, or all results if key is None."""
+        self._lock.acquire()
+        try:
+            if key is None:
+                keys = self._entries.keys()
+            else:
+                keys = [key]
+            for k in keys:
+                entry = self._entries.pop(k)
+                if entry is not None:
+                    self._evicted(k, entry)
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """Return a dict of the cache's entries, bytes and counters."""
+        self._lock.acquire()
+        try:
+            stats = self._entries.stats()
+            stats['bytes'] = stats.pop('total_size')
+            stats['max_bytes'] = stats.pop('maxsize')
+            stats['expirations'] = self.expirations
+            return stats
+        finally:
+            self._lock.release()
+
+# The default ResultCache used by Cursor.execute_cached.
+result_cache = ResultCache()
+
 # Type specific constructors as required by the DB-API 2 specification.
 Date = datetime.date
 Time = datetime.time
@@ -651,6 +2003,59 @@ def _cvtComDate(comDate):
     return (datetime.datetime.fromordinal(day_count + _ordinal_1899_12_31) +
         datetime.timedelta(milliseconds=fraction_of_day * _milliseconds_per_day))
 
+def _cvtComDates(comDates):
+    """Convert a column of COM dates, returning the same values as _cvtComDate would.
+
+    Midnight is computed once per distinct day, and the time of day is added
+    as a whole number of microseconds, split and rounded the same way
+    timedelta(milliseconds=...) does it. Uses NumPy for the arithmetic when
+    available.
+    """
+    if numpy is not None and len(comDates) >= _numpy_min_dates:
+        dates_as_float = numpy.array(
+            [numpy.nan if d is None else float(d) for d in comDates], 'float64')
+        nulls = numpy.isnan(dates_as_float)
+        dates_as_float[nulls] = 0
+        day_counts = numpy.trunc(dates_as_float)
+        milliseconds = numpy.abs(dates_as_float - day_counts) * _milliseconds_per_day
+        whole_ms = numpy.floor(milliseconds)
+        microseconds = (milliseconds - whole_ms) * 1000.0
+        whole_us = numpy.floor(microseconds)
+        microseconds = whole_ms * 1000 + whole_us + (microseconds - whole_us >= 0.5)
+        parts = zip(day_counts.astype('int64').tolist(), microseconds.astype('int64').tolist(), nulls.tolist())
+    else:
+        parts = list()
+        for d in comDates:
+            if d is None:
+                parts.append((0, 0, True))
+                continue
+            date_as_float = float(d)
+            day_count = int(date_as_float)
+            milliseconds = abs(date_as_float - day_count) * _milliseconds_per_day
+            whole_ms = math.floor(milliseconds)
+            microseconds = (milliseconds - whole_ms) * 1000.0
+            whole_us = math.floor(microseconds)
+            microseconds = int(whole_ms) * 1000 + int(whole_us) + (microseconds - whole_us >= 0.5)
+            parts.append((day_count, microseconds, False))
+
+    midnights = dict()
+    fromordinal = datetime.datetime.fromordinal
+    timedelta = datetime.timedelta
+    results = list()
+    for day_count, microseconds, is_null in parts:
+        if is_null:
+            results.append(None)
+            continue
+        midnight = midnights.get(day_count)
+        if midnight is None:
+            midnight = midnights[day_count] = fromordinal(day_count + _ordinal_1899_12_31)
+        results.append(midnight + timedelta(0, 0, microseconds))
+    return results
+
+# Smallest column for which _cvtComDates uses NumPy; the array setup
+# costs more than it saves on short columns.
+_numpy_min_dates = 64
+
 _variantConversions = MultiMap(
     {
         adoDateTimeTypes : _cvtComDate,
@@ -663,6 +2068,142 @@ _variantConversions = MultiMap(
     }, 
     lambda x: x)
 
+# ADO types whose COM variants are already the Python values we want.
+_adoIdentityTypes = adoStringTypes + adoIntegerTypes
+
+def _column_decoder(adType):
+    """Return a converter for a whole result column with the given ADO type.
+
+    The converter takes the column's values and returns an iterable of
+    converted values. Returns None if the values can be used as-is.
+    """
+    if adType in _adoIdentityTypes:
+        return None
+
+    if adType in adoDateTimeTypes:
+        return _cvtComDates
+
+    convert = _variantConversions.storage.get(adType)
+    if convert is None:
+        return None
+
+    def decode(variant):
+        if variant is None:
+            return None
+        return convert(variant)
+
+    def decode_column(column):
+        return imap(decode, column)
+    return decode_column
+
+# array.array type codes for fetch_columns. 64-bit integer columns stay lists,
+# as there is no portable 64-bit array type code.
+_adoArrayTypecodes = {
+    adTinyInt: 'b',
+    adSmallInt: 'h',
+    adInteger: 'l',
+    adError: 'l',
+    adUnsignedTinyInt: 'B',
+    adUnsignedSmallInt: 'H',
+    adUnsignedInt: 'L',
+    adSingle: 'f',
+    adDouble: 'd',
+}
+
+def _compact_column(adType, values):
+    """Return the list of column values as an array.array when its ADO type allows it."""
+    typecode = _adoArrayTypecodes.get(adType)
+    if typecode is None or None in values:
+        return values
+    return array.array(typecode, values)
+
+# NumPy dtypes for fetchnumpy, other ADO types use object arrays.
+# Unsigned types get a dtype that holds their whole range.
+_numpy_dtypes = MultiMap(
+    {
+        tuple([t for t in adoIntegerTypes if t != adUnsignedInt]): 'int32',
+        (adUnsignedInt, adBigInt, adFileTime): 'int64',
+        (adUnsignedBigInt,): 'uint64',
+        adoApproximateNumericTypes: 'float64',
+        adoDateTimeTypes: 'datetime64[ms]',
+        (adBoolean,): 'bool',
+    },
+    'object')
+
+def _com_dates_to_datetime64(com_dates):
+    """Convert a float64 array of COM dates to datetime64[ms], the same way _cvtComDate does."""
+    day_counts = numpy.trunc(com_dates)
+    milliseconds = numpy.round(numpy.abs(com_dates - day_counts) * _milliseconds_per_day)
+    day_counts += _ordinal_1899_12_31 - _ordinal_1970_01_01
+    return (day_counts * _milliseconds_per_day + milliseconds).astype('int64').view('datetime64[ms]')
+
+class _NumpyColumn(object):
+    """A growable NumPy array for one result column, used by fetchnumpy."""
+    def __init__(self, column_desc, capacity):
+        ado_type = column_desc[1]
+        self.dtype = numpy.dtype(_numpy_dtypes[ado_type])
+        self.is_date = ado_type in adoDateTimeTypes
+        self.decode = _column_decoder(ado_type)
+        self.data = numpy.empty(capacity, self.dtype)
+        self.mask = None
+        if column_desc[6]:
+            self.mask = numpy.zeros(capacity, bool)
+        self.count = 0
+
+    def _reserve(self, count):
+        capacity = len(self.data)
+        if self.count + count <= capacity:
+            return
+        capacity = max(capacity * 2, self.count + count)
+        self.data.resize(capacity, refcheck=False)
+        if self.mask is not None:
+            self.mask.resize(capacity, refcheck=False)
+
+    def extend(self, values, are_variants):
+        """Append column values; are_variants is True for raw GetRows values."""
+        count = len(values)
+        if not count:
+            return
+        self._reserve(count)
+        start, end = self.count, self.count + count
+
+        nulls = [v is None for v in values]
+        if True in nulls:
+            if self.mask is not None:
+                self.mask[start:end] = nulls
+            values = list(values)
+            filler = 0
+            if self.dtype.kind == 'O':
+                filler = None
+            for i, is_null in enumerate(nulls):
+                if is_null:
+                    values[i] = filler
+
+        if self.dtype.kind == 'O':
+            if are_variants and self.decode is not None:
+                values = self.decode(values)
+            # Assign one by one so sequence-like values (buffers) stay scalars.
+            data = self.data
+            for i, v in enumerate(values):
+                data[start + i] = v
+        elif self.is_date and are_variants:
+            self.data[start:end] = _com_dates_to_datetime64(
+                numpy.array([float(v) for v in values], 'float64'))
+        elif self.is_date:
+            self.data[start:end] = [numpy.datetime64(v, 'ms') for v in values]
+        else:
+            self.data[start:end] = values
+
+        self.count = end
+
+    def finish(self):
+        """Return the filled array, trimmed to size."""
+        self.data.resize(self.count, refcheck=False)
+        if self.mask is None:
+            return self.data
+        self.mask.resize(self.count, refcheck=False)
+        return numpy.ma.array(self.data, mask=self.mask)
+
 # Mapping Python data types to ADO type codes
 def _ado_type(data):
     if isinstance(data, basestring):
@@ -0,0 +1,188 @@
+"""Query plans for querysets and raw SQL.
+
+    from sqlserver_ado.explain import explain
+
+    for plan in explain(Order.objects.filter(customer__name='x')):
+        print plan.format()
+
+explain() runs the statement under SET SHOWPLAN_XML ON, which compiles it
+without running it and returns the estimated plan. With actual=True it runs
+under SET STATISTICS XML ON instead, which executes the statement (including
+any changes it makes) and adds the actual row counts.
+
+The plan XML is parsed into a tree of PlanNode operators, with their estimated
+cost and rows, the actual rows and warnings such as implicit conversions;
+the statement's missing index suggestions are collected as well.
+"""
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+_ns = '{http://schemas.microsoft.com/sqlserver/2004/07/showplan}'
+
+# Name of the column SQL Server returns plans in.
+_plan_column = 'Microsoft SQL Server 2005 XML Showplan'
+
+
+class PlanNode(object):
+    """One operator of a plan, with its children (its inputs)."""
+    def __init__(self, element):
+        self.node_id = int(element.get('NodeId', -1))
+        self.physical_op = element.get('PhysicalOp')
+        self.logical_op = element.get('LogicalOp')
+        self.estimated_rows = float(element.get('EstimateRows', 0))
+        self.estimated_cost = float(element.get('EstimatedTotalSubtreeCost', 0))
+        self.object = None
+        self.actual_rows = None
+        self.warnings = list()
+        self.children = list()
+
+        self._scan(element)
+
+    def _scan(self, element):
+        """Read the details of this operator, and its child operators, below element."""
+        for child in element:
+            tag = child.tag[len(_ns):]
+            if tag == 'RelOp':
+                self.children.append(PlanNode(child))
+            elif tag == 'RunTimeInformation':
+                self.actual_rows = sum([int(counters.get('ActualRows', 0))
+                    for counters in child.findall(_ns + 'RunTimeCountersPerThread')])
+            elif tag == 'Warnings':
+                self.warnings.extend(_warnings(child))
+            elif tag == 'Object' and self.object is None:
+                self.object = '.'.join([child.get(part) for part in ('Database', 'Schema', 'Table', 'Index')
+                    if child.get(part)])
+                self._scan(child)
+            else:
+                self._scan(child)
+
+    def walk(self):
+        """Iterate over this node and all nodes below it, depth first."""
+        yield self
+        for child in self.children:
+            for node in child.walk():
+                yield node
+
+    def format(self, depth=0):
+        line = '%s%s (%s) cost=%.4f rows=%g' % ('  ' * depth, self.physical_op, self.logical_op,
+            self.estimated_cost, self.estimated_rows)
+        if self.actual_rows is not None:
+            line += ' actual=%i' % self.actual_rows
+        if self.object:
+            line += ' on %s' % self.object
+        lines = [line] + ['%s  ! %s' % ('  ' * depth, warning) for warning in self.warnings]
+        for child in self.children:
+            lines.append(child.format(depth + 1))
+        return '\n'.join(lines)
+
+
+class Plan(object):
+    """The plan of one statement.
+
+    statement -- The statement text.
+    estimated_cost -- Estimated cost of the statement.
+    root -- The top PlanNode, or None for statements without a plan.
+    warnings -- Statement warnings.
+    missing_indexes -- Missing index suggestions, as strings.
+    xml -- The plan XML.
+    """
+    def __init__(self, statement_element, xml):
+        self.statement = statement_element.get('StatementText')
+        self.estimated_cost = float(statement_element.get('StatementSubTreeCost', 0))
+        self.xml = xml
+        self.root = None
+        self.warnings = list()
+        self.missing_indexes = list()
+
+        query_plan = statement_element.find(_ns + 'QueryPlan')
+        if query_plan is None:
+            return
+        relop = query_plan.find(_ns + 'RelOp')
+        if relop is not None:
+            self.root = PlanNode(relop)
+        warnings = query_plan.find(_ns + 'Warnings')
+        if warnings is not None:
+            self.warnings.extend(_warnings(warnings))
+        for group in query_plan.findall('%sMissingIndexes/%sMissingIndexGroup' % (_ns, _ns)):
+            for index in group.findall(_ns + 'MissingIndex'):
+                columns = ['%s: %s' % (column_group.get('Usage'),
+                        ', '.join([column.get('Name') for column in column_group.findall(_ns + 'Column')]))
+                    for column_group in index.findall(_ns + 'ColumnGroup')]
+                self.missing_indexes.append('%s.%s.%s (impact %s%%) %s' % (index.get('Database'),
+                    index.get('Schema'), index.get('Table'), group.get('Impact'), '; '.join(columns)))
+
+    def nodes(self):
+        """Iterate over all operators of the plan."""
+        if self.root is None:
+            return iter(())
+        return self.root.walk()
+
+    def format(self):
+        lines = ['%s\ncost=%.4f' % (self.statement, self.estimated_cost)]
+        lines.extend(['! %s' % warning for warning in self.warnings])
+        lines.extend(['missing index: %s' % index for index in self.missing_indexes])
+        if self.root is not None:
+            lines.append(self.root.format())
+        return '\n'.join(lines)
+
+
+def _warnings(element):
+    """Describe the warnings in a showplan Warnings element."""
+    results = list()
+    for attribute, value in element.items():
+        if value in ('true', '1'):
+            results.append(attribute)
+    for child in element:
+        tag = child.tag[len(_ns):]
+        if tag == 'PlanAffectingConvert':
+            results.append('%s: %s' % (child.get('ConvertIssue'), child.get('Expression')))
+        elif tag == 'ColumnsWithNoStatistics':
+            results.append('No statistics: %s' % ', '.join(
+                [column.get('Column') for column in child.findall(_ns + 'ColumnReference')]))
+        else:
+            results.append(tag)
+    return results
+
+def parse_plan(xml):
+    """Return a Plan for each statement in a showplan XML document."""
+    if isinstance(xml, unicode):
+        xml = xml.encode('utf-8')
+    document = ElementTree.fromstring(xml)
+    return [Plan(statement, xml) for statement in document.getiterator(_ns + 'StmtSimple')]
+
+def explain(queryset_or_sql, params=None, actual=False, using=None):
+    """Return a list of Plans for the statements of a queryset or SQL string.
+
+    params -- Parameters of the SQL string.
+    actual -- Execute the statement and include actual row counts.
+    using -- Alias of the database (default the queryset's, or the default database).
+    """
+    if isinstance(queryset_or_sql, basestring):
+        sql = queryset_or_sql
+        if using is None:
+            using = DEFAULT_DB_ALIAS
+    else:
+        if using is None:
+            using = queryset_or_sql.db
+        sql, params = queryset_or_sql.query.get_compiler(using=using).as_sql()
+
+    option = actual and 'STATISTICS XML' or 'SHOWPLAN_XML'
+    cursor = connections[using].cursor()
+    cursor.execute('SET %s ON' % option)
+    try:
+        cursor.execute(sql, params or ())
+        plans = list()
+        while True:
+            description = cursor.description
+            if description and len(description) == 1 and description[0][0] == _plan_column:
+                for row in cursor.fetchall():
+                    plans.extend(parse_plan(row[0]))
+            if not cursor.nextset():
+                break
+        return plans
+    finally:
+        cursor.execute('SET %s OFF' % option)
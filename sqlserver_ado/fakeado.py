@@ -0,0 +1,522 @@
+"""An in-process fake of the ADODB objects used by dbapi, for running the driver without Windows.
+
+dbapi takes its pythoncom and win32com modules from here instead of pywin32
+when SQLSERVER_ADO_COM=fake is set in the environment, or after
+
+    from sqlserver_ado import dbapi, fakeado
+    dbapi.use_com_layer(fakeado.pythoncom, fakeado.win32com)
+
+Connections opened with the same connection string share one FakeDatabase.
+Statements whose text was registered on it return generated result sets:
+
+    db = fakeado.database(connection_string)
+    db.register('SELECT id, name FROM orders', [('id', adInteger), ('name', adVarWChar)], 10000)
+
+Everything else runs against the FakeDatabase's in-memory sqlite database, so
+plain DDL, INSERT, UPDATE, DELETE and SELECT statements work as long as
+sqlite understands them. Result column types are inferred from the values
+sqlite returns.
+
+This is meant for benchmarks and tests of the driver's own code. It does not
+model SQL Server's type system, locking or error numbers.
+"""
+import datetime
+import decimal
+import re
+import sqlite3
+import threading
+
+from ado_consts import *
+
+class FakeComError(Exception):
+    """Raised by the fake ADO objects, standing in for pywintypes.com_error."""
+
+
+class _Namespace(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _no_op():
+    pass
+
+# Stand-ins for the parts of pythoncom and win32com.client that dbapi uses.
+pythoncom = _Namespace(
+    CoInitialize=_no_op,
+    CoUninitialize=_no_op,
+    Missing=object(),
+    Empty=object(),
+    VT_DISPATCH=9,
+    com_error=FakeComError,
+)
+
+
+def Dispatch(prog_id):
+    """Create a fake ADODB object, like win32com.client.Dispatch."""
+    try:
+        factory = _prog_ids[prog_id]
+    except KeyError:
+        raise FakeComError('Invalid class string: %s is not supported by fakeado' % (prog_id,))
+    return factory()
+
+
+def VARIANT(vt, value):
+    return value
+
+win32com = _Namespace(client=_Namespace(Dispatch=Dispatch, VARIANT=VARIANT))
+
+# Days between 1899-12-30 (COM date zero) and 0001-01-01.
+_ordinal_1899_12_30 = datetime.date(1899, 12, 30).toordinal()
+
+def com_date(value):
+    """Return the COM date (a float of days since 1899-12-30) for a date or datetime."""
+    days = value.toordinal() - _ordinal_1899_12_30
+    if isinstance(value, datetime.datetime):
+        seconds = value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+        return days + seconds / 86400.0
+    return float(days)
+
+# Values of generated result columns, as ADO type => function(row number).
+_generators = {
+    adBigInt: lambda i: long(i) * 1000,
+    adBinary: lambda i: buffer('%08i' % i),
+    adBoolean: lambda i: bool(i % 2),
+    adChar: lambda i: u'C%05i' % (i % 1000),
+    adCurrency: lambda i: decimal.Decimal(i) / 100,
+    adDBTimeStamp: lambda i: 40000.0 + i / 86400.0,
+    adDate: lambda i: 40000.0 + i / 86400.0,
+    adDecimal: lambda i: decimal.Decimal(i) / 100,
+    adDouble: lambda i: i * 0.5,
+    adGUID: lambda i: u'{00000000-0000-0000-0000-%012i}' % i,
+    adInteger: lambda i: i,
+    adLongVarBinary: lambda i: buffer('%08i' % i),
+    adLongVarWChar: lambda i: u'text %i' % i,
+    adNumeric: lambda i: decimal.Decimal(i) / 100,
+    adSingle: lambda i: i * 0.25,
+    adSmallInt: lambda i: i % 30000,
+    adTinyInt: lambda i: i % 256,
+    adUnsignedTinyInt: lambda i: i % 256,
+    adVarBinary: lambda i: buffer('%08i' % i),
+    adVarChar: lambda i: 'value %i' % i,
+    adVarWChar: lambda i: u'value %i' % i,
+    adWChar: lambda i: u'W%05i' % (i % 1000),
+}
+
+def _generator(ado_type):
+    try:
+        return _generators[ado_type]
+    except KeyError:
+        raise ValueError('No generated values for %s; give a function in the column.' % (ado_type_name(ado_type),))
+
+def generate_rows(columns, count):
+    """Return count row tuples for columns, given as for FakeDatabase.register."""
+    functions = [column[2] if len(column) > 2 else _generator(column[1]) for column in columns]
+    return [tuple([f(i) for f in functions]) for i in xrange(count)]
+
+
+class FakeDatabase(object):
+    """Registered result sets plus an in-memory sqlite database, shared by fake connections."""
+    def __init__(self):
+        self.results = list()
+        self.statements = 0
+        self.lock = threading.RLock()
+        self.sqlite = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None)
+        self.sqlite.text_factory = unicode
+
+    def register(self, sql, columns, rows):
+        """Answer statements matching sql with a generated result set.
+
+        sql -- The statement text (with ? markers), or a compiled regular
+            expression matched against it.
+        columns -- A sequence of (name, ado_type) or (name, ado_type, function)
+            tuples. function(row number) returns the column's value; columns
+            without one use a built-in generator for their type.
+        rows -- A row count, a sequence of row tuples, or a function taking the
+            parameter values and returning either of those.
+        """
+        columns = [tuple(column) for column in columns]
+        self.lock.acquire()
+        try:
+            self.results.insert(0, (sql, columns, rows))
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        """Forget registered result sets and drop all sqlite tables."""
+        self.lock.acquire()
+        try:
+            self.results = list()
+            tables = self.sqlite.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+            for (name,) in tables:
+                self.sqlite.execute('DROP TABLE "%s"' % name)
+        finally:
+            self.lock.release()
+
+    def _find_result(self, sql):
+        for pattern, columns, rows in self.results:
+            if isinstance(pattern, basestring):
+                if pattern == sql:
+                    return columns, rows
+            elif pattern.match(sql):
+                return columns, rows
+        return None
+
+    def execute(self, sql, values):
+        """Run a batch of statements, returning a list of (columns, rows, rowcount) results.
+
+        columns is None for statements without a result set.
+        """
+        self.lock.acquire()
+        try:
+            self.statements += 1
+            results = list()
+            for statement in _split_batch(sql):
+                marker_count = _count_markers(statement)
+                params, values = values[:marker_count], values[marker_count:]
+                results.append(self._execute_statement(statement, params))
+            return results
+        finally:
+            self.lock.release()
+
+    def _execute_statement(self, sql, params):
+        registered = self._find_result(sql)
+        if registered is not None:
+            columns, rows = registered
+            if callable(rows):
+                rows = rows(params)
+            if isinstance(rows, (int, long)):
+                rows = generate_rows(columns, rows)
+            return [column[:2] for column in columns], list(rows), -1
+
+        cursor = self.sqlite.execute(_sqlite_sql(sql), [_sqlite_value(value) for value in params])
+        if cursor.description is None:
+            return None, None, cursor.rowcount
+        rows = [tuple([_ado_value(value) for value in row]) for row in cursor.fetchall()]
+        columns = list()
+        for i, column_desc in enumerate(cursor.description):
+            values = [row[i] for row in rows if row[i] is not None]
+            columns.append((column_desc[0], _infer_ado_type(values[:1])))
+        return columns, rows, -1
+
+
+_databases = dict()
+_databases_lock = threading.Lock()
+
+def database(connection_string):
+    """Return the FakeDatabase that connections opened with connection_string use."""
+    _databases_lock.acquire()
+    try:
+        db = _databases.get(connection_string)
+        if db is None:
+            db = _databases[connection_string] = FakeDatabase()
+        return db
+    finally:
+        _databases_lock.release()
+
+def reset():
+    """Drop all fake databases."""
+    _databases_lock.acquire()
+    try:
+        _databases.clear()
+    finally:
+        _databases_lock.release()
+
+_re_batch_separator = re.compile(r';\s*\n')
+_re_markers = re.compile(r"'[^']*'|\?")
+
+def _split_batch(sql):
+    """Split a batch as joined by dbapi (statements separated by ';' and a newline)."""
+    statements = [s for s in _re_batch_separator.split(sql) if s.strip()]
+    return statements or [sql]
+
+def _count_markers(sql):
+    return _re_markers.findall(sql).count('?')
+
+# T-SQL spellings sqlite does not understand.
+_sqlite_replacements = [
+    (re.compile(r'^\s*SELECT\s+TOP\s+\(?(\d+)\)?\s+(.*)$', re.I | re.S), r'SELECT \2 LIMIT \1'),
+    (re.compile(r'\bGETDATE\(\)', re.I), 'CURRENT_TIMESTAMP'),
+    (re.compile(r'\bN\'', re.I), "'"),
+]
+
+def _sqlite_sql(sql):
+    for pattern, replacement in _sqlite_replacements:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+def _sqlite_value(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+def _ado_value(value):
+    if isinstance(value, str):
+        return buffer(value)
+    return value
+
+def _infer_ado_type(values):
+    for value in values:
+        if isinstance(value, bool):
+            return adBoolean
+        if isinstance(value, int):
+            return adInteger
+        if isinstance(value, long):
+            return adBigInt
+        if isinstance(value, float):
+            return adDouble
+        if isinstance(value, buffer):
+            return adVarBinary
+    return adVarWChar
+
+
+class Error(object):
+    def __init__(self, description, number=-2147217900, sql_state='42000', native_error=0):
+        self.Description = description
+        self.Number = number
+        self.SQLState = sql_state
+        self.NativeError = native_error
+        self.Source = 'fakeado'
+
+
+class Errors(list):
+    """The Errors collection of a Connection."""
+    @property
+    def Count(self):
+        return len(self)
+
+    def Clear(self):
+        del self[:]
+
+
+class Property(object):
+    def __init__(self, name, value):
+        self.Name = name
+        self.Value = value
+
+
+class Connection(object):
+    """A fake ADODB.Connection."""
+    Provider = 'fakeado'
+
+    def __init__(self):
+        self.CommandTimeout = 30
+        self.ConnectionString = ''
+        self.CursorLocation = adUseServer
+        self.IsolationLevel = adXactReadCommitted
+        self.Attributes = 0
+        self.State = adStateClosed
+        self.Errors = Errors()
+        self.Properties = [
+            Property('Transaction DDL', 8),
+            Property('DBMS Version', '10.00.0000'),
+            Property('MARS Connection', False),
+            Property('Packet Size', 4096),
+        ]
+        self.database = None
+        self.transaction_level = 0
+
+    def Open(self, *args):
+        if args:
+            self.ConnectionString = args[0]
+        self.database = database(self.ConnectionString)
+        self.State = adStateOpen
+
+    def Close(self):
+        self._check_open()
+        self.State = adStateClosed
+
+    def _check_open(self):
+        if self.State != adStateOpen:
+            raise FakeComError('Operation is not allowed when the object is closed.')
+
+    def BeginTrans(self):
+        self._check_open()
+        self.transaction_level += 1
+        return self.transaction_level
+
+    def CommitTrans(self):
+        self._check_open()
+        self.transaction_level -= 1
+
+    def RollbackTrans(self):
+        self._check_open()
+        self.transaction_level -= 1
+
+    def _execute(self, sql, values):
+        """Run sql on the database, returning the first Recordset and its rowcount."""
+        self._check_open()
+        self.Errors.Clear()
+        try:
+            results = self.database.execute(sql, values)
+        except sqlite3.Error, e:
+            sql_state = '42000'
+            if isinstance(e, sqlite3.IntegrityError):
+                sql_state = '23000'
+            self.Errors.append(Error(unicode(e), sql_state=sql_state))
+            raise FakeComError(unicode(e))
+        return Recordset.from_results(results)
+
+
+class Parameter(object):
+    def __init__(self, name='', ado_type=adEmpty, direction=adParamInput, size=0, value=None):
+        self.Name = name
+        self.Type = ado_type
+        self.Direction = direction
+        self.Size = size
+        self.Value = value
+        self.Precision = 0
+        self.NumericScale = 0
+        self.Attributes = 0
+
+    def AppendChunk(self, data):
+        if self.Value is None:
+            self.Value = data
+        else:
+            self.Value = buffer(str(self.Value) + str(data))
+
+
+class Parameters(list):
+    """The Parameters collection of a Command."""
+    def __call__(self, index):
+        return self[index]
+
+    @property
+    def Count(self):
+        return len(self)
+
+    def Append(self, parameter):
+        self.append(parameter)
+
+    def Refresh(self):
+        raise FakeComError('fakeado does not support stored procedures.')
+
+
+class Command(object):
+    """A fake ADODB.Command."""
+    def __init__(self):
+        self.ActiveConnection = None
+        self.CommandText = ''
+        self.CommandTimeout = 30
+        self.CommandType = adCmdText
+        self.Prepared = False
+        self.State = adStateClosed
+        self.Parameters = Parameters()
+
+    def CreateParameter(self, name='', ado_type=adEmpty, direction=adParamInput, size=0, value=None):
+        return Parameter(name, ado_type, direction, size, value)
+
+    def Execute(self, *args):
+        if self.CommandType != adCmdText:
+            raise FakeComError('fakeado only supports adCmdText commands.')
+        if self.ActiveConnection is None:
+            raise FakeComError('The connection cannot be used to perform this operation.')
+        values = [p.Value for p in self.Parameters]
+        return self.ActiveConnection._execute(self.CommandText, values)
+
+    def Cancel(self):
+        self.State = adStateClosed
+
+
+class Field(object):
+    def __init__(self, name, ado_type, defined_size=0):
+        self.Name = name
+        self.Type = ado_type
+        self.ActualSize = defined_size
+        self.DefinedSize = defined_size
+        self.Precision = 0
+        self.NumericScale = 0
+        self.Attributes = adFldMayBeNull
+
+
+class Recordset(object):
+    """A fake, forward-only ADODB.Recordset over rows held in memory."""
+    def __init__(self):
+        self.ActiveConnection = None
+        self.CursorLocation = adUseServer
+        self.State = adStateClosed
+        self.Fields = list()
+        self._rows = list()
+        self._position = 0
+        self._next = list()
+        self._table = None
+        self._added = list()
+
+    @classmethod
+    def from_results(cls, results):
+        """Return (Recordset, rowcount) for the first of a list of (columns, rows, rowcount) results."""
+        columns, rows, rowcount = results[0]
+        rs = cls()
+        rs._next = results[1:]
+        if columns is not None:
+            rs.Fields = [Field(name, ado_type) for name, ado_type in columns]
+            rs._rows = rows
+            rs.State = adStateOpen
+        return rs, rowcount
+
+    @property
+    def BOF(self):
+        return not self._rows
+
+    @property
+    def EOF(self):
+        return self._position >= len(self._rows)
+
+    def GetRows(self, rows=-1):
+        """Return the next rows, column by column."""
+        if self.EOF:
+            raise FakeComError('Either BOF or EOF is True, or the current record has been deleted.')
+        if rows is None or rows < 0:
+            rows = len(self._rows)
+        chunk = self._rows[self._position:self._position + rows]
+        self._position += len(chunk)
+        return tuple(zip(*chunk))
+
+    def MoveFirst(self):
+        self._position = 0
+
+    def NextRecordset(self):
+        self.State = adStateClosed
+        if not self._next:
+            return None, -1
+        return Recordset.from_results(self._next)
+
+    def Close(self):
+        if self.State == adStateClosed:
+            raise FakeComError('Operation is not allowed when the object is closed.')
+        self.State = adStateClosed
+
+    # Batch updates, as used by Cursor.bulk_insert.
+
+    def Open(self, source, connection, cursor_type=adOpenForwardOnly, lock_type=adLockReadOnly, options=adCmdText):
+        match = _re_select_from.match(source)
+        if match is None:
+            raise FakeComError('fakeado can only open "SELECT columns FROM table" recordsets.')
+        self.ActiveConnection = connection
+        self._table = match.group(2)
+        self.Fields = [Field(name.strip(), adVariant) for name in match.group(1).split(',')]
+        self._rows = list()
+        self._added = list()
+        self.State = adStateOpen
+
+    def AddNew(self, field_names, values):
+        self._added.append(list(values))
+
+    def UpdateBatch(self, affect=adAffectAll):
+        if not self._added:
+            return
+        names = ', '.join([f.Name for f in self.Fields])
+        markers = ', '.join(['?'] * len(self.Fields))
+        sql = 'INSERT INTO %s (%s) VALUES (%s)' % (self._table, names, markers)
+        for values in self._added:
+            self.ActiveConnection._execute(sql, values)
+        self._added = list()
+
+_re_select_from = re.compile(r'^\s*SELECT\s+(?:TOP\s+\(?\d+\)?\s+)?(.+?)\s+FROM\s+(\S+)', re.I | re.S)
+
+_prog_ids = {
+    'ADODB.Command': Command,
+    'ADODB.Connection': Connection,
+    'ADODB.Recordset': Recordset,
+}
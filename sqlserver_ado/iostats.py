@@ -0,0 +1,69 @@
+"""SET STATISTICS IO and TIME for a block, parsed per statement.
+
+    from sqlserver_ado.iostats import statistics_io_time
+
+    with statistics_io_time() as statistics:
+        list(Order.objects.filter(status='open'))
+
+    statistics.reads_by_table()     # {'Orders': {'scan_count': 1, 'logical_reads': 20, ...}}
+    statistics.timings              # dbapi.StatementTiming with io and server times
+
+The server's informational messages are captured through
+Connection.capture_messages, which also makes them visible in
+cursor.messages while the block runs.
+"""
+import re
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+# The block's own SET statements, possibly behind tag comments.
+_re_set_statistics = re.compile(r'^\s*(?:/\*.*?\*/\s*)*SET\s+STATISTICS\s', re.IGNORECASE | re.DOTALL)
+
+
+class statistics_io_time(object):
+    """Turn on SET STATISTICS IO and TIME on a database connection for a with block.
+
+    using -- Alias of the database.
+    """
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.timings = list()
+        self._connection = None
+
+    def _record(self, timing):
+        if not _re_set_statistics.match(timing.operation):
+            self.timings.append(timing)
+
+    def _set(self, value):
+        cursor = self._connection.cursor()
+        try:
+            cursor.execute('SET STATISTICS IO, TIME %s' % value)
+        finally:
+            cursor.close()
+
+    def __enter__(self):
+        wrapper = connections[self.using]
+        wrapper.cursor()
+        self._connection = wrapper.connection
+        self._capture_messages = self._connection.capture_messages
+        self._connection.capture_messages = True
+        self._connection.add_listener(self._record)
+        self._set('ON')
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self._set('OFF')
+        finally:
+            self._connection.remove_listener(self._record)
+            self._connection.capture_messages = self._capture_messages
+
+    def reads_by_table(self):
+        """Return a dict of table => SET STATISTICS IO counters, summed over the block."""
+        totals = dict()
+        for timing in self.timings:
+            for table, counters in (timing.io or {}).iteritems():
+                table_totals = totals.setdefault(table, dict())
+                for name, value in counters.iteritems():
+                    table_totals[name] = table_totals.get(name, 0) + value
+        return totals
@@ -0,0 +1,141 @@
+"""Detection of N+1 query patterns: the same SELECT run over and over with new parameters.
+
+    from sqlserver_ado.nplusone import detect_n_plus_one
+
+    with detect_n_plus_one(threshold=5, raise_errors=True):
+        for order in Order.objects.all():
+            order.customer.name         # one query per order
+
+A parameterized SELECT whose fingerprint (see stats.fingerprint) runs more
+than threshold times in the block is reported: with the Python stack of the
+first run over the threshold, the number of runs and the total time spent.
+Reports are issued as NPlusOneWarning, or raised as NPlusOneError at the end
+of the block when raise_errors is set, which is meant for tests.
+
+NPlusOneMiddleware checks every request, using OPTIONS['n_plus_one_threshold']
+of the default database (default 10).
+"""
+import re
+import threading
+import traceback
+import warnings
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+from stats import fingerprint
+
+_re_select = re.compile(r'^\s*(?:/\*.*?\*/\s*)*SELECT\s', re.IGNORECASE | re.DOTALL)
+
+_local = threading.local()
+
+# Stack frames from these modules are left out of reports.
+_internal_modules = ('sqlserver_ado', 'django/db', 'django\\db')
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+class NPlusOneReport(object):
+    """One repeated statement: its fingerprint, number of runs, total seconds and stack."""
+    def __init__(self, fingerprint, stack):
+        self.fingerprint = fingerprint
+        self.stack = stack
+        self.count = 0
+        self.total = 0.0
+
+    def __str__(self):
+        return 'Statement ran %i times (%.3fs): %s\n%s' % (
+            self.count, self.total, self.fingerprint, ''.join(self.stack))
+
+
+def _listener(timing):
+    """Timing listener feeding the active detectors of the current thread."""
+    detectors = getattr(_local, 'detectors', None)
+    if not detectors or not timing.parameter_count or not _re_select.match(timing.operation):
+        return
+    key = fingerprint(timing.operation)
+    for detector in detectors:
+        detector._record(key, timing)
+
+def _application_stack():
+    return [line for line in traceback.format_stack()[:-3]
+        if not [module for module in _internal_modules if module in line.split('\n')[0]]]
+
+
+class detect_n_plus_one(object):
+    """Watch the statements run by the current thread on a database for N+1 patterns.
+
+    threshold -- Number of runs of a statement that are tolerated.
+    raise_errors -- Raise NPlusOneError at the end of the block instead of warning.
+    using -- Alias of the database.
+    """
+    def __init__(self, threshold=10, raise_errors=False, using=DEFAULT_DB_ALIAS):
+        self.threshold = threshold
+        self.raise_errors = raise_errors
+        self.using = using
+        self._counts = dict()
+        self.reports = list()
+
+    def _record(self, key, timing):
+        counts = self._counts
+        entry = counts.get(key)
+        if entry is None:
+            entry = counts[key] = [0, 0.0, None]
+        entry[0] += 1
+        entry[1] += timing.total
+        if entry[0] == self.threshold + 1:
+            entry[2] = NPlusOneReport(key, _application_stack())
+            self.reports.append(entry[2])
+        if entry[2] is not None:
+            entry[2].count, entry[2].total = entry[0], entry[1]
+
+    def start(self):
+        # Make sure the (possibly new) connection has the listener.
+        wrapper = connections[self.using]
+        wrapper.cursor()
+        if _listener not in wrapper.connection.listeners:
+            wrapper.connection.add_listener(_listener)
+
+        detectors = getattr(_local, 'detectors', None)
+        if detectors is None:
+            detectors = _local.detectors = []
+        detectors.append(self)
+
+    def finish(self):
+        """Stop watching, then warn or raise for the repeated statements."""
+        _local.detectors.remove(self)
+        if not self.reports:
+            return
+        if self.raise_errors:
+            raise NPlusOneError('\n'.join([str(report) for report in self.reports]))
+        for report in self.reports:
+            warnings.warn(str(report), NPlusOneWarning)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            _local.detectors.remove(self)
+            return
+        self.finish()
+
+
+class NPlusOneMiddleware(object):
+    """Warn about N+1 patterns in each request, see the module docstring."""
+    def process_request(self, request):
+        options = connections[DEFAULT_DB_ALIAS].settings_dict.get('OPTIONS') or {}
+        request._n_plus_one = detect_n_plus_one(options.get('n_plus_one_threshold', 10))
+        request._n_plus_one.start()
+
+    def process_response(self, request, response):
+        detector = getattr(request, '_n_plus_one', None)
+        if detector is not None:
+            del request._n_plus_one
+            detector.finish()
+        return response
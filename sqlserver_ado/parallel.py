@@ -0,0 +1,181 @@
+"""Run independent queries concurrently, each on a worker thread's own connection.
+
+    from sqlserver_ado.parallel import execute_parallel
+
+    orders, totals = execute_parallel([
+        Order.objects.filter(customer=customer),
+        ("SELECT SUM(total) FROM orders WHERE customer_id = %s", [customer.pk]),
+    ])
+
+Querysets are evaluated into lists of model instances, (sql, params) pairs
+return the list of row tuples (or the rowcount for statements without a
+result set). Results come back in the order of the queries. Each (sql,
+params) pair is committed after it ran, so INSERT, UPDATE and DELETE
+statements take effect.
+
+Each worker thread initializes its own COM apartment and uses its own
+thread-local Django connection, which it closes after every query. Enable
+OPTIONS['pool'] so that closing returns the connection to the pool; workers
+are long-lived, so they keep reusing their pooled connections. The pool's
+max_size should leave room for the workers next to the request threads.
+
+The queries run outside the calling thread's transaction, so they do not see
+its uncommitted changes, and their own changes are committed even if the
+calling thread's transaction is rolled back.
+"""
+import Queue
+import threading
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+import dbapi
+
+# Number of worker threads of the executors used by execute_parallel.
+default_max_workers = 4
+
+# Tells a worker thread to exit.
+_stop = object()
+
+
+class ParallelQueryError(Exception):
+    """Raised by ParallelExecutor.run when some of the queries failed.
+
+    results -- The list of results, holding the exception for failed queries.
+    errors -- A dict of query index => exception.
+    """
+    def __init__(self, results, errors):
+        first = min(errors)
+        Exception.__init__(self, '%i of %i queries failed; query %i: %s' %
+            (len(errors), len(results), first, errors[first]))
+        self.results = results
+        self.errors = errors
+
+
+class ParallelExecutor(object):
+    """A set of worker threads running queries against one database.
+
+    max_workers -- Number of worker threads, started on first use.
+    using -- Alias of the database for (sql, params) queries. Querysets use
+        their own database.
+    """
+    def __init__(self, max_workers=None, using=DEFAULT_DB_ALIAS):
+        if max_workers is None:
+            max_workers = default_max_workers
+        self.max_workers = max_workers
+        self.using = using
+        self._tasks = Queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def _start_workers(self, count):
+        self._lock.acquire()
+        try:
+            while len(self._workers) < min(count, self.max_workers):
+                worker = threading.Thread(target=self._work, name='sqlserver_ado parallel worker')
+                worker.setDaemon(True)
+                worker.start()
+                self._workers.append(worker)
+        finally:
+            self._lock.release()
+
+    def _work(self):
+        dbapi.pythoncom.CoInitialize()
+        try:
+            while True:
+                task = self._tasks.get()
+                if task is _stop:
+                    return
+                index, query, results = task
+                try:
+                    results.put((index, self._execute(query), None))
+                except Exception, e:
+                    results.put((index, None, e))
+        finally:
+            dbapi.pythoncom.CoUninitialize()
+
+    def _execute(self, query):
+        if hasattr(query, 'query'):
+            connection = connections[query.db]
+            try:
+                return list(query)
+            finally:
+                connection.close()
+
+        sql, params = query
+        connection = connections[self.using]
+        try:
+            cursor = connection.cursor()
+            cursor.execute(sql, params)
+            if cursor.description is None:
+                result = cursor.rowcount
+            else:
+                result = cursor.fetchall()
+            # Closing rolls back, so changes have to be committed here.
+            transaction.commit_unless_managed(using=self.using)
+            return result
+        finally:
+            connection.close()
+
+    def run(self, queries, raise_errors=True):
+        """Run queries concurrently and return their results, in order.
+
+        queries -- A sequence of querysets and (sql, params) pairs.
+        raise_errors -- If True (default), raise ParallelQueryError when any
+            query failed, after all queries have finished. If False, the
+            exception is returned in place of a failed query's result.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        if not self.max_workers:
+            raise ValueError('ParallelExecutor needs at least one worker.')
+
+        self._start_workers(len(queries))
+        done = Queue.Queue()
+        for index, query in enumerate(queries):
+            self._tasks.put((index, query, done))
+
+        results = [None] * len(queries)
+        errors = dict()
+        for i in xrange(len(queries)):
+            index, result, error = done.get()
+            if error is not None:
+                errors[index] = result = error
+            results[index] = result
+
+        if errors and raise_errors:
+            raise ParallelQueryError(results, errors)
+        return results
+
+    def shutdown(self):
+        """Stop the worker threads, after the queued queries have run."""
+        self._lock.acquire()
+        try:
+            workers, self._workers = self._workers, []
+        finally:
+            self._lock.release()
+        for worker in workers:
+            self._tasks.put(_stop)
+        for worker in workers:
+            worker.join()
+
+
+_executors = dict()
+_executors_lock = threading.Lock()
+
+def execute_parallel(queries, using=DEFAULT_DB_ALIAS, raise_errors=True):
+    """Run queries concurrently on a shared executor for the database, see ParallelExecutor.run."""
+    _executors_lock.acquire()
+    try:
+        executor = _executors.get(using)
+        if executor is None:
+            executor = _executors[using] = ParallelExecutor(using=using)
+    finally:
+        _executors_lock.release()
+    return executor.run(queries, raise_errors)
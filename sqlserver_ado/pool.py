@@ -0,0 +1,365 @@
+"""A process-level pool of dbapi connections, used by DatabaseWrapper.
+
+Enable it with the 'pool' key in the database OPTIONS:
+
+    'OPTIONS': {
+        'pool': {
+            'min_size': 0,          # idle_timeout keeps at least this many connections
+            'max_size': 10,         # maximum open connections in the process
+            'max_lifetime': 3600,   # seconds before a connection is replaced, or None
+            'idle_timeout': 300,    # seconds an idle connection is kept, or None
+            'wait_timeout': 30,     # seconds to wait for a connection when at max_size
+            'ping_interval': 10,    # check connections idle longer than this with a query
+        },
+    }
+
+ADO connections are COM objects that belong to the apartment of the thread
+that created them, so an idle connection is only handed out again to the
+thread that opened it. Size limits and counters apply to the whole process.
+When threads are waiting for capacity, a returned connection is closed
+instead of being kept idle, so the waiters can open their own. A thread that
+finds the pool at max_size closes an idle connection of another thread,
+preferring threads that have exited, and opens its own in that slot.
+
+Connections are only opened on checkout; min_size does not pre-open any, it
+only stops idle_timeout from closing connections below that size.
+"""
+import thread
+import threading
+import time
+
+import dbapi as Database
+from ado_consts import adStateOpen
+
+# Default pool settings, see the module docstring.
+defaults = {
+    'min_size': 0,
+    'max_size': 10,
+    'max_lifetime': 3600,
+    'idle_timeout': 300,
+    'wait_timeout': 30,
+    'ping_interval': 10,
+}
+
+_pools = dict()
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, connect, options=None):
+    """Return the process-level pool for key, creating it on first use.
+
+    key -- A hashable identifying the database, e.g. its connection string.
+    connect -- A callable returning a new dbapi Connection.
+    options -- A dict overriding the pool defaults; only used when the pool
+        is created.
+    """
+    _pools_lock.acquire()
+    try:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(connect, **(options or {}))
+        return pool
+    finally:
+        _pools_lock.release()
+
+def all_pools():
+    """Return a list of all pools created in this process."""
+    _pools_lock.acquire()
+    try:
+        return _pools.values()
+    finally:
+        _pools_lock.release()
+
+
+class _PoolEntry(object):
+    """Bookkeeping for one pooled connection."""
+    def __init__(self, connection):
+        self.connection = connection
+        self.thread = thread.get_ident()
+        self.created = self.returned = time.time()
+
+
+class ConnectionPool(object):
+    def __init__(self, connect, min_size=None, max_size=None, max_lifetime=None,
+            idle_timeout=None, wait_timeout=None, ping_interval=None):
+        def option(value, name):
+            if value is None:
+                return defaults[name]
+            return value
+
+        self._connect = connect
+        self.min_size = option(min_size, 'min_size')
+        self.max_size = option(max_size, 'max_size')
+        self.max_lifetime = option(max_lifetime, 'max_lifetime')
+        self.idle_timeout = option(idle_timeout, 'idle_timeout')
+        self.wait_timeout = option(wait_timeout, 'wait_timeout')
+        self.ping_interval = option(ping_interval, 'ping_interval')
+
+        self._lock = threading.Condition()
+        # Idle entries per owning thread, most recently returned last.
+        self._idle = dict()
+        # Entries for connections that are checked out, by id(connection).
+        self._in_use = dict()
+        self._waiting = 0
+
+        # Open connections, idle or in use.
+        self.size = 0
+
+        # Counters
+        self.checkouts = 0
+        self.creations = 0
+        self.waits = 0
+        self.closes = 0
+        self.failed_checks = 0
+
+    def stats(self):
+        """Return a dict of the pool's size and counters."""
+        self._lock.acquire()
+        try:
+            return dict(
+                size=self.size,
+                idle=sum([len(entries) for entries in self._idle.itervalues()]),
+                in_use=len(self._in_use),
+                checkouts=self.checkouts,
+                creations=self.creations,
+                waits=self.waits,
+                closes=self.closes,
+                failed_checks=self.failed_checks,
+            )
+        finally:
+            self._lock.release()
+
+    def _expired(self, entry, now):
+        if self.max_lifetime is not None and now - entry.created > self.max_lifetime:
+            return True
+        if self.idle_timeout is not None and now - entry.returned > self.idle_timeout:
+            return self.size > self.min_size
+        return False
+
+    def _take_expired(self, ident, now):
+        """Remove this thread's expired idle entries, returning them. Call with the lock held."""
+        entries = self._idle.get(ident)
+        if not entries:
+            return []
+        kept, expired = [], []
+        for entry in entries:
+            if self._expired(entry, now):
+                expired.append(entry)
+                self.size -= 1
+            else:
+                kept.append(entry)
+        if expired:
+            entries[:] = kept
+            self._lock.notifyAll()
+        return expired
+
+    def _take_idle_slot(self, ident):
+        """Remove and return an idle entry of another thread, leaving its slot counted in size.
+
+        Entries of exited threads go first, then the least recently returned.
+        Returns None if there is no such entry. Call with the lock held.
+        """
+        alive = set([t.ident for t in threading.enumerate()])
+        victim = None
+        for owner, entries in self._idle.iteritems():
+            if owner == ident or not entries:
+                continue
+            if owner not in alive:
+                victim = entries[0]
+                break
+            if victim is None or entries[0].returned < victim.returned:
+                victim = entries[0]
+        if victim is None:
+            return None
+        entries = self._idle[victim.thread]
+        entries.remove(victim)
+        if not entries:
+            del self._idle[victim.thread]
+        return victim
+
+    def _discard(self, entry):
+        """Close the ADO connection of another thread's entry, already removed from the pool. Call without the lock.
+
+        Connection.close would uninitialize COM on the calling thread, which
+        did not initialize it for this connection, so only the ADO connection
+        is closed.
+        """
+        self._lock.acquire()
+        try:
+            self.closes += 1
+        finally:
+            self._lock.release()
+        try:
+            entry.connection._close_connection()
+        except Exception:
+            pass
+
+    def _close(self, entries):
+        """Close the connections of entries already removed from the pool. Call without the lock."""
+        if not entries:
+            return
+        self._lock.acquire()
+        try:
+            self.closes += len(entries)
+        finally:
+            self._lock.release()
+        for entry in entries:
+            try:
+                entry.connection.close()
+            except Database.Error:
+                pass
+
+    def _alive(self, entry):
+        """A cheap liveness check, querying the server only after ping_interval idle seconds."""
+        try:
+            if entry.connection.adoConn.State != adStateOpen:
+                return False
+            if time.time() - entry.returned > self.ping_interval:
+                # Not through a cursor, so pings are not tagged, recorded or timed.
+                entry.connection._ping()
+            return True
+        except Exception:
+            return False
+
+    def checkout(self):
+        """Return an open connection, reusing one of this thread's idle connections if possible.
+
+        Raises OperationalError if max_size connections stay open for longer
+        than wait_timeout seconds.
+        """
+        ident = thread.get_ident()
+        while True:
+            entry = None
+            victim = None
+            self._lock.acquire()
+            try:
+                deadline = None
+                while True:
+                    expired = self._take_expired(ident, time.time())
+                    if expired:
+                        self._lock.release()
+                        try:
+                            self._close(expired)
+                        finally:
+                            self._lock.acquire()
+
+                    entries = self._idle.get(ident)
+                    if entries:
+                        entry = entries.pop()
+                        self._in_use[id(entry.connection)] = entry
+                        self.checkouts += 1
+                        break
+
+                    if self.size < self.max_size:
+                        self.size += 1
+                        self.checkouts += 1
+                        break
+
+                    victim = self._take_idle_slot(ident)
+                    if victim is not None:
+                        self.checkouts += 1
+                        break
+
+                    if deadline is None:
+                        self.waits += 1
+                        deadline = time.time() + self.wait_timeout
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise Database.OperationalError(
+                            'Timed out waiting for a pooled connection (max_size=%i)' % self.max_size)
+                    self._waiting += 1
+                    try:
+                        self._lock.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+            finally:
+                self._lock.release()
+
+            if entry is None:
+                if victim is not None:
+                    self._discard(victim)
+                return self._create()
+
+            if self._alive(entry):
+                return entry.connection
+
+            self._lock.acquire()
+            try:
+                self.failed_checks += 1
+                del self._in_use[id(entry.connection)]
+                self.size -= 1
+                self.checkouts -= 1
+                self._lock.notifyAll()
+            finally:
+                self._lock.release()
+            self._close([entry])
+
+    def _create(self):
+        """Open a new connection for a slot already counted in size."""
+        try:
+            connection = self._connect()
+        except:
+            self._lock.acquire()
+            try:
+                self.size -= 1
+                self._lock.notifyAll()
+            finally:
+                self._lock.release()
+            raise
+
+        entry = _PoolEntry(connection)
+        self._lock.acquire()
+        try:
+            self.creations += 1
+            self._in_use[id(connection)] = entry
+        finally:
+            self._lock.release()
+        return connection
+
+    def checkin(self, connection):
+        """Return a connection to the pool, rolling back any open transaction."""
+        self._lock.acquire()
+        try:
+            entry = self._in_use.pop(id(connection), None)
+        finally:
+            self._lock.release()
+
+        if entry is None:
+            # Not one of ours.
+            connection.close()
+            return
+
+        keep = True
+        try:
+            connection.messages = []
+            if connection.supportsTransactions:
+                connection.rollback()
+        except Exception:
+            keep = False
+
+        now = time.time()
+        entry.returned = now
+        self._lock.acquire()
+        try:
+            if keep and not self._waiting and not self._expired(entry, now):
+                self._idle.setdefault(entry.thread, []).append(entry)
+                expired = self._take_expired(entry.thread, now)
+            else:
+                expired = [entry]
+                self.size -= 1
+            self._lock.notifyAll()
+        finally:
+            self._lock.release()
+        self._close(expired)
+
+    def close_idle(self):
+        """Close the calling thread's idle connections."""
+        ident = thread.get_ident()
+        self._lock.acquire()
+        try:
+            entries = self._idle.pop(ident, [])
+            self.size -= len(entries)
+            self._lock.notifyAll()
+        finally:
+            self._lock.release()
+        self._close(entries)
@@ -0,0 +1,186 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+_table = 'dbbench_rows'
+
+_default_mix = 'point=50,range=20,page=10,insert=10,many=10'
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks the backend against the configured database with a mix of "
+        "point lookups, range scans, sliced pages, inserts and executemany loads. "
+        "Creates (and drops) a table named %s. Prints a JSON report." % _table)
+
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database', default='default',
+            help='Database to benchmark.'),
+        make_option('--threads', action='store', type='int', dest='threads', default=4,
+            help='Number of client threads, each with its own connection.'),
+        make_option('--duration', action='store', type='float', dest='duration', default=10.0,
+            help='Seconds to run the mix for.'),
+        make_option('--rows', action='store', type='int', dest='rows', default=10000,
+            help='Number of rows to seed the table with.'),
+        make_option('--mix', action='store', dest='mix', default=_default_mix,
+            help='Operation weights, default %s.' % _default_mix),
+        make_option('--keep', action='store_true', dest='keep', default=False,
+            help='Keep the benchmark table afterwards.'),
+    )
+
+    requires_model_validation = False
+
+    def handle(self, *args, **options):
+        import json
+        from django.db import connections
+        from sqlserver_ado import dbapi
+        from sqlserver_ado.base import make_connection_string
+
+        try:
+            mix = [(name, int(weight)) for name, weight in
+                [item.split('=') for item in options['mix'].split(',')]]
+        except ValueError:
+            raise CommandError('--mix must look like %s' % _default_mix)
+        unknown = set([name for name, weight in mix]) - set(_operations)
+        if unknown:
+            raise CommandError('Unknown operations in --mix: %s' % ', '.join(sorted(unknown)))
+
+        connection_string = make_connection_string(connections[options['database']].settings_dict)
+        connection = dbapi.connect(connection_string)
+        try:
+            _create_table(connection, options['rows'])
+            try:
+                report = _run(connection_string, mix, options['threads'], options['duration'], options['rows'])
+            finally:
+                if not options['keep']:
+                    cursor = connection.cursor()
+                    cursor.execute('DROP TABLE %s' % _table)
+                    connection.commit()
+        finally:
+            connection.close()
+        print json.dumps(report, indent=2, sort_keys=True)
+
+
+def _create_table(connection, rows):
+    import datetime, decimal
+    cursor = connection.cursor()
+    cursor.execute("IF OBJECT_ID('%s') IS NOT NULL DROP TABLE %s" % (_table, _table))
+    cursor.execute('CREATE TABLE %s (id int IDENTITY PRIMARY KEY, k int NOT NULL, '
+        'name nvarchar(50) NOT NULL, amount decimal(12, 2) NULL, created datetime NOT NULL)' % _table)
+    cursor.execute('CREATE INDEX %s_k ON %s (k)' % (_table, _table))
+    now = datetime.datetime.now()
+    cursor.executemany('INSERT INTO %s (k, name, amount, created) VALUES (%%s, %%s, %%s, %%s)' % _table,
+        [(i, u'name %i' % i, decimal.Decimal(i % 1000) / 10, now) for i in xrange(rows)])
+    connection.commit()
+
+def _point(cursor, random, rows):
+    cursor.execute('SELECT id, k, name, amount, created FROM %s WHERE k = %%s' % _table, [random.randrange(rows)])
+    cursor.fetchall()
+
+def _range(cursor, random, rows):
+    start = random.randrange(rows)
+    cursor.execute('SELECT id, k, name, amount, created FROM %s WHERE k >= %%s AND k < %%s' % _table,
+        [start, start + 100])
+    cursor.fetchall()
+
+def _page(cursor, random, rows):
+    # The shape of the SQL the compiler emits for a sliced queryset.
+    start = random.randrange(rows)
+    cursor.execute('SELECT _row_num, id, k, name, amount, created FROM ('
+        'SELECT ROW_NUMBER() OVER (ORDER BY id) AS _row_num, id, k, name, amount, created FROM %s'
+        ') AS QQQ WHERE %%s < _row_num AND _row_num <= %%s' % _table, [start, start + 25])
+    cursor.fetchall()
+
+def _insert(cursor, random, rows):
+    import datetime
+    cursor.execute('INSERT INTO %s (k, name, amount, created) VALUES (%%s, %%s, %%s, %%s)' % _table,
+        [rows + random.randrange(rows), u'inserted', None, datetime.datetime.now()])
+
+def _many(cursor, random, rows):
+    import datetime
+    now = datetime.datetime.now()
+    cursor.executemany('INSERT INTO %s (k, name, amount, created) VALUES (%%s, %%s, %%s, %%s)' % _table,
+        [(rows + random.randrange(rows), u'many', None, now) for i in xrange(100)])
+
+_operations = {
+    'point': _point,
+    'range': _range,
+    'page': _page,
+    'insert': _insert,
+    'many': _many,
+}
+
+def _run(connection_string, mix, thread_count, duration, rows):
+    import random as random_module
+    import threading
+    import time
+    from sqlserver_ado import dbapi
+    from sqlserver_ado.workload import percentile
+
+    choices = list()
+    for name, weight in mix:
+        choices.extend([name] * weight)
+    results = dict([(name, dict(latencies=[], errors=0, com=0.0, convert=0.0)) for name, weight in mix])
+    lock = threading.Lock()
+
+    def work(seed):
+        random = random_module.Random(seed)
+        connection = dbapi.connect(connection_string)
+        timings = list()
+        connection.add_listener(timings.append)
+        local = dict([(name, dict(latencies=[], errors=0, com=0.0, convert=0.0)) for name, weight in mix])
+        try:
+            cursor = connection.cursor()
+            deadline = time.time() + duration
+            while time.time() < deadline:
+                name = random.choice(choices)
+                del timings[:]
+                start = time.time()
+                try:
+                    _operations[name](cursor, random, rows)
+                    connection.commit()
+                except dbapi.Error:
+                    local[name]['errors'] += 1
+                    # Start the next operation outside the failed transaction.
+                    try:
+                        connection.rollback()
+                    except dbapi.Error:
+                        pass
+                    cursor = connection.cursor()
+                    continue
+                local[name]['latencies'].append(time.time() - start)
+                for timing in timings:
+                    local[name]['com'] += timing.bind + timing.execute + timing.fetch
+                    local[name]['convert'] += timing.convert
+        finally:
+            connection.close()
+        lock.acquire()
+        try:
+            for name, values in local.iteritems():
+                results[name]['latencies'].extend(values['latencies'])
+                for key in ('errors', 'com', 'convert'):
+                    results[name][key] += values[key]
+        finally:
+            lock.release()
+
+    threads = [threading.Thread(target=work, args=(seed,)) for seed in xrange(thread_count)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    report = dict(threads=thread_count, duration=elapsed, rows=rows, operations=dict())
+    for name, values in results.iteritems():
+        latencies = sorted(values['latencies'])
+        report['operations'][name] = dict(
+            count=len(latencies),
+            errors=values['errors'],
+            ops_per_second=len(latencies) / elapsed,
+            p50_ms=latencies and percentile(latencies, 50) * 1000 or None,
+            p95_ms=latencies and percentile(latencies, 95) * 1000 or None,
+            p99_ms=latencies and percentile(latencies, 99) * 1000 or None,
+            com_seconds=values['com'],
+            convert_seconds=values['convert'],
+        )
+    return report
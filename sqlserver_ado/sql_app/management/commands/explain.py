@@ -0,0 +1,33 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = "Prints the query plan of a SQL statement."
+    args = '"<sql>"'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database', default='default',
+            help='Database to explain the statement on.'),
+        make_option('--actual', action='store_true', dest='actual', default=False,
+            help='Execute the statement and show actual row counts.'),
+        make_option('--xml', action='store_true', dest='xml', default=False,
+            help='Print the plan XML instead of the plan tree.'),
+    )
+
+    requires_model_validation = False
+
+    def handle(self, *args, **options):
+        from sqlserver_ado.explain import explain
+
+        if len(args) != 1:
+            raise CommandError('Give the SQL statement as one argument.')
+
+        plans = explain(args[0], actual=options['actual'], using=options['database'])
+        if options['xml']:
+            for xml in sorted(set([plan.xml for plan in plans])):
+                print xml
+            return
+        for plan in plans:
+            print plan.format()
+            print
@@ -0,0 +1,36 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = "Replays captured workload files against a database and reports throughput and latency."
+    args = '<workload file> [workload file ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database', default='default',
+            help='Database to replay against.'),
+        make_option('--mode', action='store', dest='mode', default='original',
+            help='original, accelerated or fixed.'),
+        make_option('--speed', action='store', type='float', dest='speed', default=1.0,
+            help='Speed-up factor for the accelerated mode.'),
+        make_option('--concurrency', action='store', type='int', dest='concurrency', default=4,
+            help='Number of threads for the fixed mode.'),
+    )
+
+    requires_model_validation = False
+
+    def handle(self, *paths, **options):
+        import json
+        from django.db import connections
+        from sqlserver_ado.base import make_connection_string
+        from sqlserver_ado.workload import replay
+
+        if not paths:
+            raise CommandError('Give one or more workload files.')
+
+        connection_string = make_connection_string(connections[options['database']].settings_dict)
+        try:
+            report = replay(paths, connection_string, options['mode'], options['speed'], options['concurrency'])
+        except (IOError, ValueError), e:
+            raise CommandError(str(e))
+        print json.dumps(report, indent=2, sort_keys=True)
@@ -0,0 +1,43 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+class Command(BaseCommand):
+    help = "Shows the statements taking the most time, from statement_stats snapshot files."
+    args = '[snapshot file ...]'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database', default='default',
+            help='Database whose OPTIONS["statement_stats"]["path"] names the snapshot file.'),
+        make_option('--limit', action='store', type='int', dest='limit', default=20,
+            help='Number of statements to show.'),
+        make_option('--order', action='store', dest='order', default='total',
+            help='Order by total, calls, mean, max, rows or errors.'),
+    )
+
+    requires_model_validation = False
+
+    def handle(self, *paths, **options):
+        from glob import glob
+        from django.db import connections
+        from sqlserver_ado import stats
+
+        if not paths:
+            settings = connections[options['database']].settings_dict.get('OPTIONS') or {}
+            config = settings.get('statement_stats')
+            path = isinstance(config, dict) and config.get('path')
+            if not path:
+                raise CommandError('Give snapshot files, or set OPTIONS["statement_stats"]["path"].')
+            paths = glob(path % dict(pid='*'))
+
+        try:
+            rows = stats.top(stats.load(paths), options['limit'], options['order'])
+        except (IOError, ValueError), e:
+            raise CommandError(str(e))
+
+        print '%10s %7s %12s %10s %10s %10s  %s' % (
+            'total (s)', 'calls', 'mean (ms)', 'max (ms)', 'rows', 'errors', 'statement')
+        for key, row in rows:
+            print '%10.3f %7i %12.3f %10.3f %10i %10i  %s' % (
+                row['total'], row['calls'], row['mean'] * 1000, row['max'] * 1000,
+                row['rows'], row['errors'], key)
@@ -0,0 +1,214 @@
+"""Statement statistics, aggregated per fingerprint of the SQL text.
+
+Enable them with the 'statement_stats' key in the database OPTIONS:
+
+    'OPTIONS': {
+        'statement_stats': {
+            'max_statements': 5000,     # fingerprints kept; the least recently run are dropped
+            'path': '/var/tmp/sqlstats-%(pid)s.json',  # optional snapshot file
+            'save_interval': 60,        # seconds between snapshots
+        },
+    }
+
+or set it to True for the defaults. Statistics are kept per process in
+statement_stats; read them with statement_stats.top(), or from the snapshot
+files with the sqlstats management command.
+
+fingerprint() replaces literals and parameter markers with "?" and collapses
+IN lists, so statements that differ only in their values share an entry.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from dbapi import LRUCache
+
+# Default settings, see the module docstring.
+defaults = {
+    'max_statements': 5000,
+    'path': None,
+    'save_interval': 60,
+}
+
+_re_fingerprint_tokens = re.compile(r"""
+    (\[[^\]]*\])                            # quoted identifier, kept
+    |(N?'(?:[^']|'')*')                     # string literal
+    |(0x[0-9a-fA-F]*)                       # binary literal
+    |(%s|\?)                                # parameter marker
+    |(\b\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)     # number
+    |(\s+)                                  # whitespace
+    """, re.VERBOSE)
+
+_re_in_list = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+
+def _fingerprint_token(match):
+    if match.group(1):
+        return match.group(1)
+    if match.group(6):
+        return ' '
+    return '?'
+
+_fingerprint_cache = LRUCache(1000)
+_fingerprint_cache_lock = threading.Lock()
+
+def fingerprint(sql):
+    """Return sql normalized for grouping: literals replaced by "?" and IN lists collapsed."""
+    _fingerprint_cache_lock.acquire()
+    try:
+        result = _fingerprint_cache.get(sql)
+    finally:
+        _fingerprint_cache_lock.release()
+    if result is not None:
+        return result
+
+    result = _re_fingerprint_tokens.sub(_fingerprint_token, sql).strip()
+    result = _re_in_list.sub('IN (...)', result)
+
+    _fingerprint_cache_lock.acquire()
+    try:
+        _fingerprint_cache.put(sql, result)
+    finally:
+        _fingerprint_cache_lock.release()
+    return result
+
+def fingerprint_id(sql):
+    """Return a short, stable id for the fingerprint of sql."""
+    if isinstance(sql, unicode):
+        sql = sql.encode('utf-8')
+    return hashlib.md5(fingerprint(sql)).hexdigest()[:16]
+
+
+class StatementStats(object):
+    """A timing listener (see dbapi.Connection.add_listener) aggregating statements per fingerprint.
+
+    Each entry counts calls, errors and rows, and the total and maximum
+    seconds spent in the statement's execution and fetching. While SET
+    STATISTICS IO output is captured (see iostats), logical reads are summed too.
+    """
+    # Columns top() can order by.
+    orderings = ('total', 'calls', 'mean', 'max', 'rows', 'errors', 'logical_reads')
+
+    def __init__(self, max_statements=None, path=None, save_interval=None):
+        self._lock = threading.Lock()
+        self._statements = LRUCache(1)
+        self.configure(max_statements, path, save_interval)
+
+    def configure(self, max_statements=None, path=None, save_interval=None):
+        """Change the settings, see the module docstring. None leaves a setting at its default."""
+        def option(value, name):
+            if value is None:
+                return defaults[name]
+            return value
+
+        self._lock.acquire()
+        try:
+            self.path = option(path, 'path')
+            self.save_interval = option(save_interval, 'save_interval')
+            self._last_save = time.time()
+            statements = LRUCache(option(max_statements, 'max_statements'))
+            for key in self._statements.keys():
+                statements.put(key, self._statements.get(key))
+            self._statements = statements
+        finally:
+            self._lock.release()
+
+    def __call__(self, timing):
+        key = fingerprint(timing.operation)
+        now = time.time()
+        self._lock.acquire()
+        try:
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = dict(calls=0, errors=0, rows=0, logical_reads=0, total=0.0, max=0.0, first=now, last=now)
+                self._statements.put(key, stats)
+            total = timing.total
+            stats['calls'] += 1
+            stats['errors'] += timing.error
+            stats['rows'] += timing.rows
+            if timing.io:
+                stats['logical_reads'] += sum([counters.get('logical_reads', 0) for counters in timing.io.itervalues()])
+            stats['total'] += total
+            stats['max'] = max(stats['max'], total)
+            stats['last'] = now
+            save = self.path is not None and now - self._last_save >= self.save_interval
+            if save:
+                self._last_save = now
+        finally:
+            self._lock.release()
+        if save:
+            self.save()
+
+    def snapshot(self):
+        """Return a dict of fingerprint => dict of its counters."""
+        self._lock.acquire()
+        try:
+            return dict([(key, dict(self._statements.get(key))) for key in self._statements.keys()])
+        finally:
+            self._lock.release()
+
+    def top(self, limit=20, order_by='total'):
+        """Return up to limit (fingerprint, stats) pairs, the largest by order_by first."""
+        return top(self.snapshot(), limit, order_by)
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self._statements.clear()
+        finally:
+            self._lock.release()
+
+    def save(self, path=None):
+        """Write a snapshot as JSON to path (default self.path), where "%(pid)s" is the process id."""
+        if path is None:
+            path = self.path
+        path = path % dict(pid=os.getpid())
+        temp_path = '%s.%i.tmp' % (path, threading.current_thread().ident)
+        f = open(temp_path, 'wb')
+        try:
+            json.dump(self.snapshot(), f)
+        finally:
+            f.close()
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
+
+
+def load(paths):
+    """Read and merge snapshots written by StatementStats.save, returning fingerprint => stats."""
+    merged = dict()
+    for path in paths:
+        f = open(path, 'rb')
+        try:
+            snapshot = json.load(f)
+        finally:
+            f.close()
+        for key, stats in snapshot.iteritems():
+            into = merged.get(key)
+            if into is None:
+                merged[key] = stats
+                continue
+            for name in ('calls', 'errors', 'rows', 'logical_reads', 'total'):
+                into[name] += stats.get(name, 0)
+            into['max'] = max(into['max'], stats['max'])
+            into['first'] = min(into['first'], stats['first'])
+            into['last'] = max(into['last'], stats['last'])
+    return merged
+
+def top(snapshot, limit=20, order_by='total'):
+    """Return up to limit (fingerprint, stats) pairs of snapshot, the largest by order_by first."""
+    if order_by not in StatementStats.orderings:
+        raise ValueError('Cannot order statement stats by %r, use one of: %s' %
+            (order_by, ', '.join(StatementStats.orderings)))
+    rows = list()
+    for key, stats in snapshot.iteritems():
+        stats = dict(stats)
+        stats['mean'] = stats['total'] / max(stats['calls'], 1)
+        rows.append((key, stats))
+    rows.sort(key=lambda row: row[1][order_by], reverse=True)
+    return rows[:limit]
+
+# The process-wide statistics used by the database backend.
+statement_stats = StatementStats()
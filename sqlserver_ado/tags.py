@@ -0,0 +1,138 @@
+"""Leading SQL comments naming the code that ran a statement.
+
+Enable it with OPTIONS['tag_sql'] = True. Queries built by the ORM are then
+prefixed with their model, and every statement run through the backend's
+cursors with the current tags:
+
+    /* view=shop.views.order_detail */ /* model=shop.Order */ SELECT ...
+
+TaggingMiddleware tags each request with its view. Application code adds its
+own tags for a block or function with tagged:
+
+    with tagged(job='nightly_export'):
+        ...
+
+Comments only hold values that are the same for every run of a call site,
+and the tagged SQL is cached, so identical call sites keep sending identical
+text and SQL Server can keep reusing their plans.
+"""
+import threading
+
+from dbapi import LRUCache
+
+_local = threading.local()
+
+# (comment, sql) => tagged sql
+_tagged_sql_cache = LRUCache(1000)
+_tagged_sql_cache_lock = threading.Lock()
+
+# model class => comment
+_model_comments = dict()
+
+def _clean(value):
+    return unicode(value).replace('*/', '* /').replace('\n', ' ')
+
+def _make_comment(tags):
+    return u'/* %s */ ' % u', '.join([u'%s=%s' % (_clean(name), _clean(value)) for name, value in tags])
+
+def current_comment():
+    """Return the comment for the current thread's tags, or '' if there are none."""
+    return getattr(_local, 'comment', '')
+
+def push_tags(**tags):
+    """Add tags for the current thread, until the matching pop_tags call."""
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = [()]
+    merged = dict(stack[-1])
+    merged.update(tags)
+    merged = tuple(sorted(merged.items()))
+    stack.append(merged)
+    _local.comment = merged and _make_comment(merged) or ''
+
+def reset_tags():
+    """Remove all tags of the current thread."""
+    _local.stack = [()]
+    _local.comment = ''
+
+def pop_tags():
+    """Remove the tags added by the last push_tags call."""
+    stack = _local.stack
+    stack.pop()
+    _local.comment = stack[-1] and _make_comment(stack[-1]) or ''
+
+
+class tagged(object):
+    """Tag the statements run in a with block or decorated function."""
+    def __init__(self, **tags):
+        self.tags = tags
+
+    def __enter__(self):
+        push_tags(**self.tags)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pop_tags()
+
+    def __call__(self, function):
+        def wrapper(*args, **kwargs):
+            push_tags(**self.tags)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                pop_tags()
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+
+def tag_sql(sql, parameters=None):
+    """Return sql with the current thread's comment prepended; the tagger for dbapi connections.
+
+    Statements with parameters go through the cursor's %s formatting, so %
+    in the comment is escaped as %% for them.
+    """
+    comment = getattr(_local, 'comment', '')
+    if not comment:
+        return sql
+
+    escape = bool(parameters)
+    key = (comment, sql, escape)
+    _tagged_sql_cache_lock.acquire()
+    try:
+        result = _tagged_sql_cache.get(key)
+        if result is None:
+            if escape:
+                result = comment.replace('%', '%%') + sql
+            else:
+                result = comment + sql
+            _tagged_sql_cache.put(key, result)
+        return result
+    finally:
+        _tagged_sql_cache_lock.release()
+
+def model_comment(model):
+    """Return the comment naming model, for SQLCompiler.as_sql."""
+    comment = _model_comments.get(model)
+    if comment is None:
+        comment = _model_comments[model] = _make_comment(
+            [('model', '%s.%s' % (model._meta.app_label, model._meta.object_name))])
+    return comment
+
+
+class TaggingMiddleware(object):
+    """Tag each request's statements with the module and name of its view."""
+    def process_request(self, request):
+        # Drop tags left over by a request that ended in an exception.
+        reset_tags()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = getattr(view_func, '__name__', view_func.__class__.__name__)
+        push_tags(view='%s.%s' % (view_func.__module__, name))
+        request._sqlserver_ado_tagged = True
+
+    def process_response(self, request, response):
+        if getattr(request, '_sqlserver_ado_tagged', False):
+            del request._sqlserver_ado_tagged
+            pop_tags()
+        return response
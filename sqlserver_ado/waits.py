@@ -0,0 +1,140 @@
+"""Server wait statistics for a unit of work on one connection.
+
+    from sqlserver_ado.waits import capture_waits
+
+    with capture_waits() as waits:
+        ...
+    waits.by_category()     # {'network': 12, 'lock': 0, 'io': 3, 'cpu': 1, 'other': 0}
+
+Waits are read from sys.dm_exec_session_wait_stats (SQL Server 2016 and
+later) for the connection's own session, before and after the block; the
+difference is what the block waited on. Each snapshot is a single query,
+returning the session id along with the waits so that a reconnect in the
+middle of the block is noticed. When settings.DEBUG is set, the difference
+is also appended to the connection's query log.
+
+WaitStatsMiddleware does the same for every request.
+"""
+import time
+
+from django.db import connections, DEFAULT_DB_ALIAS
+
+_snapshot_sql = (
+    "SELECT @@SPID, wait_type, waiting_tasks_count, wait_time_ms, signal_wait_time_ms "
+    "FROM sys.dm_exec_session_wait_stats WHERE session_id = @@SPID")
+
+# Wait type prefixes => category, checked in order.
+_categories = (
+    ('ASYNC_NETWORK_IO', 'network'),
+    ('NETWORK_IO', 'network'),
+    ('LCK_M_', 'lock'),
+    ('PAGEIOLATCH_', 'io'),
+    ('WRITELOG', 'io'),
+    ('IO_COMPLETION', 'io'),
+    ('ASYNC_IO_COMPLETION', 'io'),
+    ('SOS_SCHEDULER_YIELD', 'cpu'),
+    ('CXPACKET', 'cpu'),
+    ('CXCONSUMER', 'cpu'),
+    ('THREADPOOL', 'cpu'),
+)
+
+def wait_category(wait_type):
+    """Return the category of a wait type: network, lock, io, cpu or other."""
+    for prefix, category in _categories:
+        if wait_type.startswith(prefix):
+            return category
+    return 'other'
+
+def snapshot(cursor):
+    """Return (session id, {wait type: (waiting tasks, wait ms, signal wait ms)}) for cursor's session."""
+    cursor.execute(_snapshot_sql)
+    session_id = None
+    waits = dict()
+    for row in cursor.fetchall():
+        session_id = row[0]
+        waits[row[1]] = tuple(row[2:])
+    if session_id is None:
+        # No waits yet; still need the session id.
+        cursor.execute("SELECT @@SPID")
+        session_id = cursor.fetchone()[0]
+    return session_id, waits
+
+
+class WaitStats(object):
+    """The waits of one connection's session between start() and finish().
+
+    using -- Alias of the database.
+
+    After finish(), delta is a dict of wait type => (waiting tasks, wait ms,
+    signal wait ms), or None if the session changed in between.
+    """
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.delta = None
+        self.elapsed = None
+        self._before = None
+
+    def start(self):
+        cursor = connections[self.using].cursor()
+        self._before = snapshot(cursor)
+        self._start_time = time.time()
+
+    def finish(self):
+        """Take the second snapshot, compute delta and add it to the query log."""
+        if self._before is None:
+            return
+        connection = connections[self.using]
+        session_id, after = snapshot(connection.cursor())
+        before_session_id, before = self._before
+        self._before = None
+        self.elapsed = time.time() - self._start_time
+
+        if session_id != before_session_id:
+            self.delta = None
+            return
+
+        delta = dict()
+        for wait_type, counts in after.iteritems():
+            old = before.get(wait_type, (0, 0, 0))
+            change = tuple([new - previous for new, previous in zip(counts, old)])
+            if change[0] or change[1]:
+                delta[wait_type] = change
+        self.delta = delta
+
+        from django.conf import settings
+        if settings.DEBUG:
+            connection.queries.append({
+                'sql': '-- wait stats: %s' % ', '.join(['%s=%ims' % item for item in sorted(self.by_category().items())]),
+                'time': '%.3f' % self.elapsed,
+                'waits': delta,
+            })
+
+    def by_category(self):
+        """Return a dict of category => wait ms, with signal (CPU queue) waits counted as cpu."""
+        totals = dict(network=0, lock=0, io=0, cpu=0, other=0)
+        for wait_type, (tasks, wait_ms, signal_ms) in (self.delta or {}).iteritems():
+            totals[wait_category(wait_type)] += wait_ms - signal_ms
+            totals['cpu'] += signal_ms
+        return totals
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.finish()
+
+capture_waits = WaitStats
+
+
+class WaitStatsMiddleware(object):
+    """Capture the default database's waits for each request, available as request.wait_stats."""
+    def process_request(self, request):
+        request.wait_stats = WaitStats()
+        request.wait_stats.start()
+
+    def process_response(self, request, response):
+        wait_stats = getattr(request, 'wait_stats', None)
+        if wait_stats is not None:
+            wait_stats.finish()
+        return response
@@ -0,0 +1,301 @@
+"""Capture of the statements run through the backend, and their replay.
+
+Record with OPTIONS['record_workload'] = '/var/tmp/workload-%(pid)s.log', or
+by setting a dbapi Connection's recorder to a WorkloadRecorder. Every
+execute, executemany and callproc is appended to the file with its
+parameters, start time, duration, connection and outcome, as are commits
+and rollbacks. execute_cached misses and execute_batch round trips are
+recorded as executes.
+
+Replay a capture against another database with the replayworkload management
+command, or replay():
+
+    report = replay(['/var/tmp/workload-1234.log'], connection_string, mode='original', speed=2.0)
+
+Modes:
+    original -- Each recorded connection runs on its own thread, starting its
+        statements at their recorded offsets.
+    accelerated -- Like original, with the offsets divided by speed (so 2.0
+        replays twice as fast).
+    fixed -- concurrency threads run the recorded connections one after the
+        other, each as fast as possible.
+
+The report holds the throughput and latency percentiles, overall and per
+statement fingerprint.
+
+The file is a stream of pickled tuples:
+    ('sql', sql id, sql)                                  -- once per distinct SQL text
+    ('statement', kind, sql id, fingerprint id, parameters, start, elapsed, connection, error)
+    ('transaction', 'commit' or 'rollback', time, connection)
+
+sql ids number the distinct SQL texts of one file. fingerprint ids are
+stats.fingerprint_id of the SQL, the same ids the statement statistics use.
+Binary (buffer) parameters are stored as _Binary strings, and read back as
+buffers.
+"""
+import atexit
+import cPickle
+import os
+import Queue
+import threading
+import time
+
+import dbapi
+from stats import fingerprint_id
+
+_recorders = dict()
+_recorders_lock = threading.Lock()
+
+def get_recorder(path):
+    """Return the process-level WorkloadRecorder for path ("%(pid)s" is the process id)."""
+    path = path % dict(pid=os.getpid())
+    _recorders_lock.acquire()
+    try:
+        recorder = _recorders.get(path)
+        if recorder is None:
+            recorder = _recorders[path] = WorkloadRecorder(path)
+        return recorder
+    finally:
+        _recorders_lock.release()
+
+
+class _Binary(str):
+    """A buffer parameter as stored in a workload file; buffers themselves do not unpickle."""
+
+def _store_parameters(parameters):
+    return tuple([_Binary(value) if isinstance(value, buffer) else value for value in parameters])
+
+def _load_parameters(parameters):
+    return tuple([buffer(str(value)) if isinstance(value, _Binary) else value for value in parameters])
+
+
+class WorkloadRecorder(object):
+    """Appends statements and transactions to a workload file; a dbapi Connection recorder."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'ab')
+        self._sql_ids = dict()
+        # id(dbapi Connection) => connection number in the file
+        self._connections = dict()
+        atexit.register(self.flush)
+
+    def _connection_number(self, connection):
+        number = self._connections.get(id(connection))
+        if number is None:
+            number = self._connections[id(connection)] = len(self._connections) + 1
+        return number
+
+    def _write(self, entry):
+        cPickle.dump(entry, self._file, cPickle.HIGHEST_PROTOCOL)
+
+    def statement(self, connection, kind, operation, parameters, start, elapsed, error):
+        if parameters is not None:
+            if kind == 'executemany':
+                parameters = [_store_parameters(p) for p in parameters]
+            else:
+                parameters = _store_parameters(parameters)
+        self._lock.acquire()
+        try:
+            ids = self._sql_ids.get(operation)
+            if ids is None:
+                ids = self._sql_ids[operation] = (len(self._sql_ids) + 1, fingerprint_id(operation))
+                self._write(('sql', ids[0], operation))
+            self._write(('statement', kind, ids[0], ids[1], parameters, start, elapsed,
+                self._connection_number(connection), error))
+        finally:
+            self._lock.release()
+
+    def transaction(self, connection, action, when):
+        self._lock.acquire()
+        try:
+            self._write(('transaction', action, when, self._connection_number(connection)))
+        finally:
+            self._lock.release()
+
+    def flush(self):
+        self._lock.acquire()
+        try:
+            if not self._file.closed:
+                self._file.flush()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            self._file.close()
+        finally:
+            self._lock.release()
+
+
+def read(paths):
+    """Return the sessions of workload files: a list of entry lists, one per recorded connection.
+
+    Entries are ('statement', kind, sql, fingerprint id, parameters, start)
+    and ('transaction', action, time), in recorded order.
+    """
+    sessions = dict()
+    for path in paths:
+        texts = dict()
+        f = open(path, 'rb')
+        try:
+            while True:
+                try:
+                    entry = cPickle.load(f)
+                except EOFError:
+                    break
+                except Exception, e:
+                    raise ValueError('%s: unreadable workload entry: %s' % (path, e))
+                if entry[0] == 'sql':
+                    texts[entry[1]] = entry[2]
+                elif entry[0] == 'statement':
+                    parameters = entry[4]
+                    if parameters is not None:
+                        if entry[1] == 'executemany':
+                            parameters = [_load_parameters(p) for p in parameters]
+                        else:
+                            parameters = _load_parameters(parameters)
+                    sessions.setdefault((path, entry[7]), []).append(
+                        ('statement', entry[1], texts[entry[2]], entry[3], parameters, entry[5]))
+                else:
+                    sessions.setdefault((path, entry[3]), []).append(
+                        ('transaction', entry[1], entry[2]))
+        finally:
+            f.close()
+    return [sessions[key] for key in sorted(sessions)]
+
+
+def percentile(sorted_values, percent):
+    """Return the percent percentile of a sorted list, or None if it is empty."""
+    if not sorted_values:
+        return None
+    index = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+def _summary(latencies, errors, duration):
+    latencies = sorted(latencies)
+    return dict(
+        count=len(latencies),
+        errors=errors,
+        ops_per_second=duration and len(latencies) / duration or None,
+        p50=percentile(latencies, 50),
+        p95=percentile(latencies, 95),
+        p99=percentile(latencies, 99),
+        max=latencies and latencies[-1] or None,
+    )
+
+
+class _Replayer(object):
+    def __init__(self, connection_string, start_time, speed):
+        self.connection_string = connection_string
+        self.start_time = start_time
+        self.speed = speed
+        self.lock = threading.Lock()
+        # fingerprint id => ([latencies], error count)
+        self.results = dict()
+        self.session_errors = list()
+
+    def run_session(self, session, first_time):
+        """Replay one recorded connection; with first_time, keep the recorded timing."""
+        try:
+            connection = dbapi.connect(self.connection_string)
+        except dbapi.Error, e:
+            self.lock.acquire()
+            try:
+                self.session_errors.append(str(e))
+            finally:
+                self.lock.release()
+            return
+        try:
+            cursor = connection.cursor()
+            for entry in session:
+                if first_time is not None:
+                    delay = self.start_time + (entry[-1] - first_time) / self.speed - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                if entry[0] == 'transaction':
+                    try:
+                        getattr(connection, entry[1])()
+                    except dbapi.Error:
+                        pass
+                    continue
+                self._run_statement(cursor, entry[1], entry[2], entry[3], entry[4])
+        finally:
+            try:
+                connection.close()
+            except dbapi.Error:
+                pass
+
+    def _run_statement(self, cursor, kind, sql, key, parameters):
+        error = False
+        start = time.time()
+        try:
+            if kind == 'execute':
+                cursor.execute(sql, parameters)
+                if cursor.description is not None:
+                    cursor.fetchall()
+            elif kind == 'executemany':
+                cursor.executemany(sql, parameters)
+            else:
+                cursor.callproc(sql, parameters)
+        except dbapi.Error:
+            error = True
+        elapsed = time.time() - start
+
+        self.lock.acquire()
+        try:
+            result = self.results.get(key)
+            if result is None:
+                result = self.results[key] = [list(), 0, sql]
+            result[0].append(elapsed)
+            result[1] += error
+        finally:
+            self.lock.release()
+
+
+def replay(paths, connection_string, mode='original', speed=1.0, concurrency=4):
+    """Replay workload files against a database, returning a report dict, see the module docstring."""
+    if mode not in ('original', 'accelerated', 'fixed'):
+        raise ValueError("Replay mode must be 'original', 'accelerated' or 'fixed', not %r" % (mode,))
+    if mode == 'original':
+        speed = 1.0
+    sessions = [session for session in read(paths) if session]
+    first_time = min([session[0][-1] for session in sessions] or [0])
+
+    replayer = _Replayer(connection_string, time.time(), float(speed))
+    threads = list()
+    if mode != 'fixed':
+        for session in sessions:
+            threads.append(threading.Thread(target=replayer.run_session, args=(session, first_time)))
+    else:
+        queue = Queue.Queue()
+        for session in sessions:
+            queue.put(session)
+        def work():
+            while True:
+                try:
+                    session = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                replayer.run_session(session, None)
+        threads = [threading.Thread(target=work) for i in xrange(concurrency)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - replayer.start_time
+
+    all_latencies, all_errors = list(), 0
+    statements = dict()
+    for key, (latencies, errors, sql) in replayer.results.iteritems():
+        all_latencies.extend(latencies)
+        all_errors += errors
+        statements[key] = _summary(latencies, errors, duration)
+        statements[key]['sql'] = sql
+
+    report = _summary(all_latencies, all_errors, duration)
+    report.update(mode=mode, speed=speed, concurrency=concurrency, duration=duration,
+        sessions=len(sessions), connection_errors=replayer.session_errors, statements=statements)
+    return report
@@ -0,0 +1,50 @@
+"""Benchmark for dbapi.connect with and without the provider capabilities cache.
+
+Needs the test database described in tests/dbsettings.py.
+
+Usage: python bench_connect.py [connections]
+"""
+import os
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..', '..'))
+sys.path.insert(0, os.path.join(here, '..'))
+
+import dbsettings
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure()
+
+from sqlserver_ado import dbapi
+
+
+def connect_times(connection_string, count, cached):
+    times = []
+    for i in xrange(count):
+        if not cached:
+            dbapi.invalidate_capabilities()
+        connection = dbapi.connect(connection_string)
+        times.append(connection.connect_time)
+        connection.close()
+    return times
+
+
+def main():
+    count = 50
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+
+    connection_string = dbsettings.make_connection_string()
+    # Warm up the provider DLLs before timing anything.
+    dbapi.connect(connection_string).close()
+
+    for cached in (False, True):
+        times = sorted(connect_times(connection_string, count, cached))
+        print '%-22s mean %.2fms, median %.2fms' % (
+            cached and 'capabilities cached' or 'properties scanned',
+            sum(times) / len(times) * 1000, times[len(times) // 2] * 1000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Micro-benchmark for converting COM date columns.
+
+Compares the per-cell _cvtComDate against the column converter
+_cvtComDates, with and without NumPy, over an audit-log shaped table:
+four datetime columns whose values fall on a handful of distinct days.
+
+Usage: python bench_dates.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure()
+
+from sqlserver_ado import dbapi
+
+ROWS = 100000
+COLUMNS = 4
+DAYS = 30
+
+
+def make_column(rows):
+    first_day = 40000
+    return [first_day + random.randrange(DAYS) + random.randrange(86400 * 300) / (86400.0 * 300)
+        for i in xrange(rows)]
+
+
+def per_cell(columns):
+    return [[dbapi._convert_to_python(d, dbapi.adDBTimeStamp) for d in column] for column in columns]
+
+
+def per_column(columns):
+    return [dbapi._cvtComDates(column) for column in columns]
+
+
+def main():
+    random.seed(0)
+    columns = [make_column(ROWS) for i in xrange(COLUMNS)]
+
+    print 'Converting %i dates' % (ROWS * COLUMNS,)
+    start = time.clock()
+    expected = per_cell(columns)
+    print '  %-24s %.3fs' % ('_cvtComDate', time.clock() - start)
+
+    numpy = dbapi.numpy
+    variants = [('_cvtComDates', None)]
+    if numpy is not None:
+        variants.insert(0, ('_cvtComDates (NumPy)', numpy))
+
+    for name, module in variants:
+        dbapi.numpy = module
+        start = time.clock()
+        results = per_column(columns)
+        print '  %-24s %.3fs' % (name, time.clock() - start)
+        assert results == expected
+    dbapi.numpy = numpy
+
+if __name__ == '__main__':
+    main()
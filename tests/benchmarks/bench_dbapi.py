@@ -0,0 +1,298 @@
+"""Micro-benchmarks for the dbapi hot paths, run against the fake ADODB provider.
+
+Needs neither Windows nor SQL Server: the COM layer is sqlserver_ado.fakeado,
+with generated result sets for fetches and an in-memory sqlite database for
+executemany. It does need Django, which dbapi imports; empty settings are
+configured here, so no settings module is required:
+
+    pip install "Django>=1.2,<1.9"
+    python tests/benchmarks/bench_dbapi.py
+
+Each benchmark reports the best time per operation over a few repeats and
+compares it with baselines.json. Baselines depend on the machine, so record
+them with --save on the machine that runs the comparison.
+
+Usage: python bench_dbapi.py [--save] [--tolerance 0.25] [--repeat 5] [benchmark ...]
+
+Exits with status 1 if a benchmark is slower than its baseline by more than
+the tolerance.
+"""
+import datetime
+import decimal
+import json
+import optparse
+import os
+import sys
+from timeit import default_timer
+
+os.environ['SQLSERVER_ADO_COM'] = 'fake'
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..', '..'))
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure()
+
+from sqlserver_ado import dbapi, fakeado
+from sqlserver_ado.ado_consts import *
+
+BASELINES = os.path.join(here, 'baselines.json')
+CONNECTION_STRING = 'PROVIDER=fakeado;DATA SOURCE=bench_dbapi'
+
+FETCH_ROWS = 20000
+
+FETCH_COLUMNS = (
+    ('id', adInteger),
+    ('name', adVarWChar),
+    ('code', adChar),
+    ('qty', adSmallInt),
+    ('big', adBigInt),
+    ('price', adDouble),
+    ('amount', adNumeric),
+    ('flag', adBoolean),
+    ('note', adVarWChar, lambda i: None),
+    ('created', adDBTimeStamp),
+)
+
+PARAMETER_VALUES = (
+    42,
+    12345678901L,
+    2.5,
+    True,
+    u'unicode text',
+    'byte string',
+    decimal.Decimal('1234.5678'),
+    decimal.Decimal('1E+3'),
+    datetime.datetime(2010, 1, 2, 3, 4, 5),
+    buffer('binary data'),
+)
+
+REWRITE_OPERATION = ("SELECT [t].[id], [t].[name] FROM [t] WHERE [t].[a] = %s AND [t].[b] = %s "
+    "AND [t].[c] IN (%s, %s, %s, %s) AND [t].[d] LIKE %s ESCAPE '\\'")
+REWRITE_MASK = '??N?E??'
+
+# Long enough to go through the SQL rewrite cache.
+REWRITE_LONG_OPERATION = "SELECT [t].[id] FROM [t] WHERE [t].[id] IN (%s)" % ', '.join(['%s'] * 100)
+REWRITE_LONG_MASK = '?' * 100
+
+EXECUTEMANY_ROWS = 2000
+
+
+def setup_connection():
+    fakeado.database(CONNECTION_STRING).clear()
+    connection = dbapi.connect(CONNECTION_STRING)
+    db = fakeado.database(CONNECTION_STRING)
+    db.register('SELECT * FROM fetch_rows', [column[:2] for column in FETCH_COLUMNS],
+        fakeado.generate_rows(FETCH_COLUMNS, FETCH_ROWS))
+    db.register('SELECT id, name FROM one_row WHERE id = ? AND name = ?',
+        [('id', adInteger), ('name', adVarWChar)], 1)
+    cursor = connection.cursor()
+    cursor.execute('CREATE TABLE bench (id integer, name varchar(50), amount numeric)')
+    connection.commit()
+    return connection
+
+
+def bench_fetch(connection):
+    """Cursor.execute plus fetchall of a 10 column result set, per row."""
+    cursor = connection.cursor()
+    def run():
+        cursor.execute('SELECT * FROM fetch_rows')
+        rows = cursor.fetchall()
+        assert len(rows) == FETCH_ROWS
+    return run, FETCH_ROWS
+
+
+def bench_fetch_chunked(connection):
+    """Cursor.execute plus fetchmany(1000) until exhausted, per row."""
+    cursor = connection.cursor()
+    def run():
+        cursor.execute('SELECT * FROM fetch_rows')
+        while cursor.fetchmany(1000):
+            pass
+    return run, FETCH_ROWS
+
+
+def bench_convert_to_python(connection):
+    """_convert_to_python on one value of each column type, per value."""
+    pairs = []
+    for row in fakeado.generate_rows(FETCH_COLUMNS, 1000):
+        for column, value in zip(FETCH_COLUMNS, row):
+            pairs.append((value, column[1]))
+    convert = dbapi._convert_to_python
+    def run():
+        for value, ado_type in pairs:
+            convert(value, ado_type)
+    return run, len(pairs)
+
+
+def bench_configure_parameter(connection):
+    """_configure_parameter on a fresh Parameter, per parameter."""
+    values = PARAMETER_VALUES * 100
+    parameters = [(fakeado.Parameter('p', dbapi._ado_type(value)), value) for value in values]
+    configure = dbapi._configure_parameter
+    def run():
+        for p, value in parameters:
+            p.Value = None
+            p.Size = 0
+            configure(p, value)
+    return run, len(parameters)
+
+
+def bench_rewrite_operation(connection):
+    """_rewrite_operation without the SQL rewrite cache, per statement."""
+    rewrite = dbapi._rewrite_operation
+    def run():
+        for i in xrange(1000):
+            rewrite(REWRITE_OPERATION, REWRITE_MASK, False)
+    return run, 1000
+
+
+def bench_rewrite_operation_cached(connection):
+    """_rewrite_operation with caching allowed, on a statement too short to be cached, per statement."""
+    rewrite = dbapi._rewrite_operation
+    def run():
+        for i in xrange(1000):
+            rewrite(REWRITE_OPERATION, REWRITE_MASK)
+    return run, 1000
+
+
+def bench_rewrite_operation_long(connection):
+    """_rewrite_operation of a 100 parameter statement without the SQL rewrite cache, per statement."""
+    rewrite = dbapi._rewrite_operation
+    def run():
+        for i in xrange(1000):
+            rewrite(REWRITE_LONG_OPERATION, REWRITE_LONG_MASK, False)
+    return run, 1000
+
+
+def bench_rewrite_operation_long_cached(connection):
+    """_rewrite_operation of a 100 parameter statement through the SQL rewrite cache, per statement."""
+    rewrite = dbapi._rewrite_operation
+    def run():
+        for i in xrange(1000):
+            rewrite(REWRITE_LONG_OPERATION, REWRITE_LONG_MASK)
+    return run, 1000
+
+
+def bench_execute(connection):
+    """Cursor.execute of a parameterized one-row query plus fetchone, per statement."""
+    cursor = connection.cursor()
+    def run():
+        for i in xrange(500):
+            cursor.execute('SELECT id, name FROM one_row WHERE id = %s AND name = %s', (i, u'name'))
+            cursor.fetchone()
+    return run, 500
+
+
+def bench_executemany_insert(connection):
+    """Cursor.executemany of an INSERT, sent as multi-row VALUES batches, per row."""
+    cursor = connection.cursor()
+    rows = [(i, u'name %i' % i, decimal.Decimal(i) / 100) for i in xrange(EXECUTEMANY_ROWS)]
+    def run():
+        cursor.execute('DELETE FROM bench')
+        cursor.executemany('INSERT INTO bench (id, name, amount) VALUES (%s, %s, %s)', rows)
+        assert cursor.rowcount == EXECUTEMANY_ROWS
+    return run, EXECUTEMANY_ROWS
+
+
+def bench_executemany_update(connection):
+    """Cursor.executemany of an UPDATE, sent as multi-statement batches, per row."""
+    cursor = connection.cursor()
+    updates = [(u'renamed %i' % i, i) for i in xrange(EXECUTEMANY_ROWS)]
+    def run():
+        cursor.executemany('UPDATE bench SET name = %s WHERE id = %s', updates)
+    return run, EXECUTEMANY_ROWS
+
+
+BENCHMARKS = (
+    bench_fetch,
+    bench_fetch_chunked,
+    bench_convert_to_python,
+    bench_configure_parameter,
+    bench_rewrite_operation,
+    bench_rewrite_operation_cached,
+    bench_rewrite_operation_long,
+    bench_rewrite_operation_long_cached,
+    bench_execute,
+    bench_executemany_insert,
+    bench_executemany_update,
+)
+
+
+def measure(setup, connection, repeat):
+    """Return the best time per operation, in seconds, over repeat runs."""
+    run, operations = setup(connection)
+    run()
+    best = None
+    for i in xrange(repeat):
+        start = default_timer()
+        run()
+        elapsed = default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / operations
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES):
+        return {}
+    f = open(BASELINES)
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+
+def save_baselines(baselines):
+    f = open(BASELINES, 'w')
+    try:
+        json.dump(baselines, f, indent=4, separators=(',', ': '), sort_keys=True)
+        f.write('\n')
+    finally:
+        f.close()
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [benchmark ...]')
+    parser.add_option('--save', action='store_true', default=False,
+        help='Store the results as the new baselines.')
+    parser.add_option('--tolerance', type='float', default=0.25,
+        help='Allowed slowdown against the baseline, as a fraction (default 0.25).')
+    parser.add_option('--repeat', type='int', default=5,
+        help='Number of timed runs per benchmark; the best one counts (default 5).')
+    options, names = parser.parse_args()
+
+    benchmarks = [f for f in BENCHMARKS if not names or f.__name__[len('bench_'):] in names]
+    if not benchmarks:
+        parser.error('Unknown benchmark; choose from: %s' %
+            ', '.join([f.__name__[len('bench_'):] for f in BENCHMARKS]))
+
+    connection = setup_connection()
+    baselines = load_baselines()
+    results = {}
+    regressions = []
+    print '%-26s %12s %12s %8s' % ('benchmark', 'us/op', 'baseline', 'change')
+    for setup in benchmarks:
+        name = setup.__name__[len('bench_'):]
+        result = results[name] = measure(setup, connection, options.repeat)
+        baseline = baselines.get(name)
+        if baseline:
+            change = result / baseline - 1
+            print '%-26s %12.3f %12.3f %+7.1f%%' % (name, result * 1e6, baseline * 1e6, change * 100)
+            if change > options.tolerance:
+                regressions.append(name)
+        else:
+            print '%-26s %12.3f %12s %8s' % (name, result * 1e6, '-', '')
+    connection.close()
+
+    if options.save:
+        baselines.update(results)
+        save_baselines(baselines)
+        print 'Saved baselines to %s' % (BASELINES,)
+    elif regressions:
+        print 'Slower than baseline by more than %i%%: %s' % (options.tolerance * 100, ', '.join(regressions))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
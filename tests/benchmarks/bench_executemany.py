@@ -0,0 +1,76 @@
+"""Benchmark for Cursor.executemany against the per-row execute loop.
+
+Needs the test database described in tests/dbsettings.py.
+
+Usage: python bench_executemany.py [rows]
+"""
+import os
+import sys
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..', '..'))
+sys.path.insert(0, os.path.join(here, '..'))
+
+import dbsettings
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure()
+
+from sqlserver_ado import dbapi
+
+CREATE = """CREATE TABLE #bench_executemany (
+    id int NOT NULL,
+    name nvarchar(50) NULL,
+    amount decimal(10, 2) NULL
+)"""
+INSERT = "INSERT INTO #bench_executemany (id, name, amount) VALUES (%s, %s, %s)"
+UPDATE = "UPDATE #bench_executemany SET name = %s WHERE id = %s"
+
+
+def execute_loop(cursor, operation, seq_of_parameters):
+    """The executemany behaviour before batching: one execute per parameter set."""
+    total = 0
+    for params in seq_of_parameters:
+        cursor.execute(operation, params)
+        total += cursor.rowcount
+    return total
+
+
+def execute_many(cursor, operation, seq_of_parameters):
+    cursor.executemany(operation, seq_of_parameters)
+    return cursor.rowcount
+
+
+def main():
+    rows = 5000
+    if len(sys.argv) > 1:
+        rows = int(sys.argv[1])
+
+    inserts = [(i, u'name %i' % i, None) for i in xrange(rows)]
+    updates = [(u'renamed %i' % i, i) for i in xrange(rows)]
+
+    connection = dbapi.connect(dbsettings.make_connection_string())
+    try:
+        cursor = connection.cursor()
+        cursor.execute(CREATE)
+        for f in (execute_loop, execute_many):
+            cursor.execute("TRUNCATE TABLE #bench_executemany")
+
+            start = time.clock()
+            inserted = f(cursor, INSERT, inserts)
+            insert_time = time.clock() - start
+
+            start = time.clock()
+            updated = f(cursor, UPDATE, updates)
+            update_time = time.clock() - start
+
+            assert inserted == rows and updated == rows, (inserted, updated)
+            print '%-14s insert %i rows: %.3fs, update %i rows: %.3fs' % (
+                f.__name__, rows, insert_time, rows, update_time)
+    finally:
+        connection.close()
+
+if __name__ == '__main__':
+    main()
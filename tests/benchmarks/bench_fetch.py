@@ -0,0 +1,102 @@
+"""Micro-benchmark for Cursor._fetch over a fake recordset of 1M cells.
+
+Compares the per-result-set column decoders against the previous
+per-cell _convert_to_python lookups.
+
+Usage: python bench_fetch.py
+"""
+import decimal
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from django.conf import settings
+if not settings.configured:
+    settings.configure()
+
+from sqlserver_ado import dbapi
+from sqlserver_ado.ado_consts import *
+
+ROWS = 100000
+
+COLUMNS = (
+    ('id', adInteger, lambda i: i),
+    ('name', adVarWChar, lambda i: u'name %i' % i),
+    ('code', adChar, lambda i: u'C%05i' % (i % 1000)),
+    ('qty', adSmallInt, lambda i: i % 100),
+    ('big', adBigInt, lambda i: long(i) * 1000),
+    ('price', adDouble, lambda i: i * 0.5),
+    ('amount', adNumeric, lambda i: decimal.Decimal(i) / 100),
+    ('flag', adBoolean, lambda i: bool(i % 2)),
+    ('note', adVarWChar, lambda i: None),
+    ('created', adDBTimeStamp, lambda i: 40000.0 + i / 86400.0),
+)
+
+
+class FakeField(object):
+    def __init__(self, name, ado_type):
+        self.Name = name
+        self.Type = ado_type
+        self.ActualSize = 0
+        self.DefinedSize = 0
+        self.Precision = 0
+        self.NumericScale = 0
+        self.Attributes = adFldMayBeNull
+
+
+class FakeRecordset(object):
+    """Just enough of an ADODB.Recordset for Cursor._fetch."""
+    def __init__(self, columns, data):
+        self.Fields = [FakeField(name, ado_type) for name, ado_type in columns]
+        self.State = adStateOpen
+        self.BOF = False
+        self.EOF = False
+        self.data = data
+
+    def GetRows(self, rows=-1):
+        return self.data
+
+
+class FakeConnection(object):
+    errorhandler = None
+    messages = []
+    capture_messages = False
+
+
+def make_data(rows):
+    return tuple(tuple(make(i) for i in xrange(rows)) for name, ado_type, make in COLUMNS)
+
+
+def fetch_per_cell(cursor):
+    """The row building used before column decoders were introduced."""
+    ado_results = cursor.rs.GetRows()
+    py_columns = list()
+    column_types = [column_desc[1] for column_desc in cursor.description]
+    for ado_type, column in zip(column_types, ado_results):
+        py_columns.append( [dbapi._convert_to_python(cell, ado_type) for cell in column] )
+    return tuple(zip(*py_columns))
+
+
+def fetch_decoded(cursor):
+    return cursor._fetch()
+
+
+def main():
+    data = make_data(ROWS)
+    cursor = dbapi.Cursor(FakeConnection())
+    cursor._description_from_recordset(
+        FakeRecordset([(name, ado_type) for name, ado_type, make in COLUMNS], data))
+
+    print 'Fetching %i cells' % (ROWS * len(COLUMNS),)
+    results = {}
+    for f in (fetch_per_cell, fetch_decoded):
+        start = time.clock()
+        results[f.__name__] = f(cursor)
+        print '  %-16s %.3fs' % (f.__name__, time.clock() - start)
+
+    assert list(results['fetch_per_cell']) == list(results['fetch_decoded'])
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,17 @@ from sqlserver_ado import dbapi
 # Base unit test
 import dbapi20
 
+def _tag(operation, parameters):
+    return '/* tagged */ ' + operation
+
+class _StatementRecorder(object):
+    """A workload recorder keeping (kind, operation) of each statement."""
+    def __init__(self):
+        self.statements = []
+
+    def statement(self, connection, kind, operation, parameters, start, elapsed, error):
+        self.statements.append((kind, operation))
+
 class test_dbapi(dbapi20.DatabaseAPI20Test):
     driver = dbapi
     connect_args = [ base.connection_string_from_settings() ]
@@ -137,3 +148,306 @@ end
             self.assertEqual(result[0], expected)
         finally:
             con.close()
+
+    def test_iter_mixed_fetch(self):
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            self.executeDDL1(cur)
+            for sql in self._populate():
+                cur.execute(sql)
+
+            cur.itersize = 4
+            cur.execute('select name from %sbooze order by name' % self.table_prefix)
+            it = iter(cur)
+            rows = [it.next()]
+            rows.append(cur.fetchone())
+            rows.extend(cur.fetchmany(2))
+            rows.extend(list(it))
+            self.assertEqual([r[0] for r in rows], self.samples)
+            self.assertEqual(cur.fetchone(), None)
+        finally:
+            con.close()
+
+    def test_fetch_columns(self):
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            cur.execute("SELECT 1 as a, N'x' as b UNION ALL SELECT 2, NULL")
+            columns = cur.fetch_columns()
+            self.assertEqual(columns.keys(), ['a', 'b'])
+            self.assertEqual(columns['a'].tolist(), [1, 2])
+            self.assertEqual(columns['b'], [u'x', None])
+        finally:
+            con.close()
+
+    def test_fetchnumpy(self):
+        if self.driver.numpy is None:
+            return
+        numpy = self.driver.numpy
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            cur.execute("SELECT 1 AS a, CAST(NULL AS int) AS b, CAST('2010-01-02T03:04:05' AS datetime) AS c "
+                "UNION ALL SELECT 2, 3, NULL")
+            columns = cur.fetchnumpy()
+            self.assertEqual(columns.keys(), ['a', 'b', 'c'])
+            self.assertEqual(columns['a'].tolist(), [1, 2])
+            self.assertEqual(columns['b'].mask.tolist(), [True, False])
+            self.assertEqual(columns['b'][1], 3)
+            self.assertEqual(columns['c'].dtype, numpy.dtype('datetime64[ms]'))
+            self.assertEqual(columns['c'].mask.tolist(), [False, True])
+            self.assertEqual(columns['c'][0], numpy.datetime64('2010-01-02T03:04:05', 'ms'))
+        finally:
+            con.close()
+
+    def test_command_cache(self):
+        con = self.driver.connect(*self.connect_args, **dict(command_cache_size=2))
+        try:
+            cur = con.cursor()
+            for i in range(3):
+                cur.execute("SELECT %s", [i])
+                self.assertEqual(cur.fetchone()[0], i)
+            cur.execute("SELECT %s", [u'text'])
+            self.assertEqual(cur.fetchone()[0], u'text')
+            self.assertEqual(con.command_cache.stats(),
+                dict(size=2, total_size=2, maxsize=2, hits=2, misses=2, evictions=0))
+        finally:
+            con.close()
+
+    def test_executemany_batches(self):
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            self.executeDDL1(cur)
+            rows = [(u'beer %i' % i,) for i in range(2500)]
+            cur.executemany('insert into %sbooze values (%%s)' % self.table_prefix, rows)
+            self.assertEqual(cur.rowcount, len(rows))
+
+            cur.executemany('update %sbooze set name = %%s where name = %%s' % self.table_prefix,
+                [(u'x', u'beer 1'), (u'y', u'beer 2'), (u'z', u'no such beer')])
+            self.assertEqual(cur.rowcount, 2)
+
+            cur.execute('select count(*) from %sbooze' % self.table_prefix)
+            self.assertEqual(cur.fetchone()[0], len(rows))
+        finally:
+            con.close()
+
+    def test_bulk_insert(self):
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            self.executeDDL1(cur)
+            batches = []
+            rows = ((s,) for s in self.samples)
+            count = cur.bulk_insert('%sbooze' % self.table_prefix, ['name'], rows,
+                batch_size=4, progress=batches.append)
+            self.assertEqual(count, len(self.samples))
+            self.assertEqual(batches, [4, len(self.samples)])
+
+            cur.execute('select name from %sbooze order by name' % self.table_prefix)
+            self.assertEqual([r[0] for r in cur.fetchall()], self.samples)
+        finally:
+            con.close()
+
+    def test_bulk_insert_table_lock(self):
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            self.executeDDL1(cur)
+            con.commit()
+            cur.bulk_insert('%sbooze' % self.table_prefix, ['name'], [(u'x',)], table_lock=True)
+            cur.execute("SELECT request_mode FROM sys.dm_tran_locks WHERE request_session_id = @@SPID "
+                "AND resource_type = 'OBJECT' AND resource_associated_entity_id = OBJECT_ID(%s)",
+                ['%sbooze' % self.table_prefix])
+            self.assertEqual([r[0] for r in cur.fetchall()], ['X'])
+        finally:
+            con.close()
+
+    def test_bulk_insert_identity_insert(self):
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            table = '%sidentity' % self.table_prefix
+            cur.execute('create table %s (id int identity(1, 1) primary key, name varchar(20))' % table)
+            count = cur.bulk_insert(table, ['id', 'name'], [(10, u'a'), (20, u'b')], identity_insert=True)
+            self.assertEqual(count, 2)
+            # IDENTITY_INSERT is switched off again.
+            cur.execute("insert into %s (name) values ('c')" % table)
+            cur.execute('select id, name from %s order by id' % table)
+            self.assertEqual([tuple(r) for r in cur.fetchall()], [(10, u'a'), (20, u'b'), (21, u'c')])
+        finally:
+            # Not committed: closing rolls back the table too.
+            con.close()
+
+    def test_capabilities(self):
+        con = self._connect()
+        try:
+            capabilities = con.capabilities
+            self.assertEqual(sorted(capabilities), ['dbms_version', 'mars', 'packet_size', 'transaction_ddl'])
+            self.assertEqual(con.supportsTransactions, capabilities['transaction_ddl'] > 0)
+            key = (con.adoConn.Provider, con.connection_string)
+            self.failUnless(key in self.driver._capabilities_cache)
+
+            other = self._connect()
+            self.assertEqual(other.capabilities, capabilities)
+            other.close()
+
+            self.driver.invalidate_capabilities(con.connection_string)
+            self.failIf(key in self.driver._capabilities_cache)
+        finally:
+            con.close()
+
+    def test_connection_pool(self):
+        from sqlserver_ado.pool import ConnectionPool
+        pool = ConnectionPool(self._connect, max_size=1, wait_timeout=0)
+        con = pool.checkout()
+        cur = con.cursor()
+        cur.execute("SELECT 1")
+        pool.checkin(con)
+
+        self.failUnless(pool.checkout() is con)
+        self.assertRaises(self.driver.OperationalError, pool.checkout)
+        pool.checkin(con)
+        pool.close_idle()
+        stats = pool.stats()
+        self.assertEqual((stats['creations'], stats['checkouts'], stats['size']), (1, 2, 0))
+
+    def test_connection_pool_ping(self):
+        from sqlserver_ado.pool import ConnectionPool
+        pool = ConnectionPool(self._connect, max_size=1, ping_interval=-1)
+        con = pool.checkout()
+        timings = []
+        con.add_listener(timings.append)
+        pool.checkin(con)
+
+        # The ping runs outside the cursor, so listeners do not see it.
+        self.failUnless(pool.checkout() is con)
+        self.assertEqual(timings, [])
+        pool.checkin(con)
+        pool.close_idle()
+
+    def test_connection_pool_other_thread_idle(self):
+        import threading
+        from sqlserver_ado.pool import ConnectionPool
+        pool = ConnectionPool(self._connect, max_size=1, wait_timeout=0)
+        def use_pool():
+            pool.checkin(pool.checkout())
+        worker = threading.Thread(target=use_pool)
+        worker.start()
+        worker.join()
+
+        # The exited thread's idle connection is closed to make room.
+        con = pool.checkout()
+        pool.checkin(con)
+        pool.close_idle()
+        stats = pool.stats()
+        self.assertEqual((stats['creations'], stats['closes'], stats['size']), (2, 2, 0))
+
+    def test_execute_cached(self):
+        con = self._connect()
+        try:
+            cache = self.driver.ResultCache(default_ttl=60)
+            cur = con.cursor()
+            for i in range(2):
+                cur.execute_cached("SELECT %s as a UNION ALL SELECT 2", [1], cache=cache)
+                self.assertEqual([r[0] for r in cur.fetchall()], [1, 2])
+            stats = cache.stats()
+            self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+        finally:
+            con.close()
+
+    def test_execute_cached_hooks(self):
+        con = self._connect()
+        try:
+            con.tagger = _tag
+            con.recorder = recorder = _StatementRecorder()
+            cache = self.driver.ResultCache(default_ttl=60)
+            cur = con.cursor()
+            for i in range(2):
+                cur.execute_cached("SELECT %s AS a", [1], cache=cache)
+                cur.fetchall()
+            # The cache hit is not recorded.
+            self.assertEqual(recorder.statements, [('execute', '/* tagged */ SELECT %s AS a')])
+        finally:
+            con.close()
+
+    def test_execute_async(self):
+        con = self._connect()
+        try:
+            cur = self.driver.AsyncCursor(con)
+            cur.execute_async("WAITFOR DELAY '00:00:01'; SELECT %s AS a", [1])
+            self.assertFalse(cur.done())
+            self.assertEqual(cur.fetchall(), [(1,)])
+
+            cur.execute_async("WAITFOR DELAY '00:00:10'; SELECT 1")
+            cur.cancel()
+            self.assertTrue(cur.done())
+            self.assertEqual(cur.description, None)
+        finally:
+            con.close()
+
+    def test_execute_batch(self):
+        con = self._connect()
+        try:
+            cur = con.cursor()
+            results = cur.execute_batch([
+                ("SELECT %s AS a", [1]),
+                ("SELECT %s AS a UNION ALL SELECT %s", [2, 3]),
+                ("SELECT 'x' AS b WHERE 1 = 0", None),
+            ])
+            self.assertEqual([[tuple(row) for row in rows] for rows in results],
+                [[(1,)], [(2,), (3,)], []])
+        finally:
+            con.close()
+
+    def test_execute_batch_hooks(self):
+        con = self._connect()
+        try:
+            con.tagger = _tag
+            con.recorder = recorder = _StatementRecorder()
+            cur = con.cursor()
+            cur.execute_batch([("SELECT %s AS a", [1]), ("SELECT 2 AS a", None)])
+            self.assertEqual(recorder.statements, [('execute', '/* tagged */ SELECT %s AS a;\nSELECT 2 AS a')])
+        finally:
+            con.close()
+
+    def test_timing_listener(self):
+        con = self._connect()
+        try:
+            timings = []
+            histogram = self.driver.TimingHistogram()
+            con.add_listener(timings.append)
+            con.add_listener(histogram)
+            cur = con.cursor()
+            cur.execute("SELECT %s AS a UNION ALL SELECT 2", [1])
+            cur.fetchall()
+            self.assertEqual(len(timings), 1)
+            self.assertEqual((timings[0].rows, timings[0].cells), (2, 2))
+            self.assertTrue(timings[0].execute > 0)
+            self.assertEqual(histogram.stats()["SELECT %s AS a UNION ALL SELECT 2"]['calls'], 1)
+
+            cur.execute("SELECT %s AS a UNION ALL SELECT 2", [1])
+            cur.fetch_columns()
+            self.assertEqual(len(timings), 2)
+            self.assertTrue(timings[1].convert > 0)
+        finally:
+            con.close()
+
+    def test_capture_messages(self):
+        con = self._connect()
+        try:
+            con.capture_messages = True
+            cur = con.cursor()
+            cur.execute("PRINT 'hello'")
+            self.assertEqual([message for klass, message in cur.messages], ['hello'])
+
+            timings = []
+            con.add_listener(timings.append)
+            cur.execute("SET STATISTICS IO ON")
+            cur.execute("SELECT COUNT(*) FROM sys.objects")
+            cur.fetchall()
+            cur.execute("SET STATISTICS IO OFF")
+            self.assertTrue('logical_reads' in timings[1].io.values()[0])
+        finally:
+            con.close()
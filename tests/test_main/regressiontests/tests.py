@@ -1,7 +1,7 @@
 import datetime
 import decimal
 from django.db import models
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 
 from regressiontests.models import Bug69Table1, Bug69Table2, Bug70Table, Bug93Table
 
@@ -148,3 +148,223 @@ class Bug93TestCase(TestCase):
 
         dates = Bug93Table.objects.filter(dt__year='2010')
         self.assertTrue(dates.count() == 2)
+
+
+class ComDateColumnTestCase(TestCase):
+    def testMatchesSingleDateConversion(self):
+        from sqlserver_ado.dbapi import _cvtComDate, _cvtComDates
+
+        com_dates = [40000.0, 40000.5, 40001.75, None, -1.25, 76522851.5625 / 86400000 + 2912622,
+            40008.81055108025] * 20
+        expected = [None if d is None else _cvtComDate(d) for d in com_dates]
+        self.assertEqual(expected, _cvtComDates(com_dates))
+        self.assertEqual(expected[:5], _cvtComDates(com_dates[:5]))
+
+
+class NumpyColumnTestCase(TestCase):
+    def testUnsignedInt(self):
+        from sqlserver_ado import dbapi
+        if dbapi.numpy is None:
+            return
+        column = dbapi._NumpyColumn(('a', dbapi.adUnsignedInt, None, None, None, None, True), 1)
+        column.extend([4000000000, None, 7], True)
+        values = column.finish()
+        self.assertEqual(values.mask.tolist(), [False, True, False])
+        self.assertEqual(values[0], 4000000000)
+        self.assertEqual(values[2], 7)
+
+
+class ParallelExecutorTestCase(TransactionTestCase):
+    def testResultsInOrder(self):
+        from sqlserver_ado.parallel import ParallelExecutor, ParallelQueryError
+        executor = ParallelExecutor(max_workers=2)
+        try:
+            results = executor.run([("SELECT %s", [i]) for i in range(5)])
+            self.assertEqual([list(rows) for rows in results], [[(i,)] for i in range(5)])
+
+            self.assertRaises(ParallelQueryError, executor.run, [("SELECT 1", []), ("SELECT * FROM no_such_table", [])])
+        finally:
+            executor.shutdown()
+
+    def testWritesAreCommitted(self):
+        from sqlserver_ado.parallel import ParallelExecutor
+        table = Bug38Table._meta.db_table
+        executor = ParallelExecutor(max_workers=2)
+        try:
+            results = executor.run([("INSERT INTO %s (d) VALUES (%%s)" % table, [decimal.Decimal(i)]) for i in range(3)])
+            self.assertEqual(results, [1, 1, 1])
+            results = executor.run([("UPDATE %s SET d = d + 10" % table, [])])
+            self.assertEqual(results, [3])
+        finally:
+            executor.shutdown()
+        self.assertEqual(sorted([b.d for b in Bug38Table.objects.all()]),
+            [decimal.Decimal('10'), decimal.Decimal('11'), decimal.Decimal('12')])
+
+
+class RewriteOperationTestCase(TestCase):
+    def testCachedMatchesUncached(self):
+        from sqlserver_ado.dbapi import _rewrite_operation, sql_rewrite_cache
+        long_in = "SELECT [t].[id] FROM [t] WHERE [t].[id] IN (%s)" % ', '.join(['%s'] * 20)
+        cases = [
+            ("SELECT [a] FROM [t] WHERE [b] = %s AND [c] = %s AND [d] = %s", '?NE',
+                "SELECT [a] FROM [t] WHERE [b] = ? AND [c] = NULL AND [d] = ''"),
+            ("SELECT [a] FROM [t] WHERE [b] LIKE '100%%' AND [c] = %s", '?',
+                "SELECT [a] FROM [t] WHERE [b] LIKE '100%' AND [c] = ?"),
+            ("SELECT '%%s' AS [a] WHERE %s = 1", '?', "SELECT '%s' AS [a] WHERE ? = 1"),
+            ("SELECT '100%%' AS [a]", '', "SELECT '100%' AS [a]"),
+            (long_in, '?' * 20, long_in.replace('%s', '?')),
+            (long_in + " AND [b] LIKE '%%x'" + ' ' * 512, '?' * 20, long_in.replace('%s', '?') + " AND [b] LIKE '%x'" + ' ' * 512),
+        ]
+        for operation, mask, expected in cases:
+            self.assertEqual(_rewrite_operation(operation, mask, False), expected)
+            self.assertEqual(_rewrite_operation(operation, mask), expected)
+            # A second call may come from the cache.
+            self.assertEqual(_rewrite_operation(operation, mask), expected)
+        self.assertTrue((long_in, '?' * 20) in sql_rewrite_cache.keys())
+
+
+class FingerprintTestCase(TestCase):
+    def testLiteralsAndInLists(self):
+        from sqlserver_ado.stats import fingerprint
+        self.assertEqual(
+            fingerprint("SELECT [t1].[c2] FROM [t1] WHERE a = 42 AND b = N'it''s'  AND c IN (%s, %s, %s)"),
+            "SELECT [t1].[c2] FROM [t1] WHERE a = ? AND b = ? AND c IN (...)")
+        self.assertEqual(fingerprint("SELECT TOP 10 * FROM t WHERE d = 0x0A"), fingerprint("SELECT TOP 5 * FROM t WHERE d = 0xFF"))
+
+
+class WaitStatsTestCase(TestCase):
+    def testCaptureWaits(self):
+        from sqlserver_ado.waits import capture_waits, wait_category
+        with capture_waits() as waits:
+            list(Bug38Table.objects.all())
+        self.assertTrue(waits.delta is not None)
+        self.assertTrue(waits.elapsed >= 0)
+        self.assertEqual(sorted(waits.by_category()), ['cpu', 'io', 'lock', 'network', 'other'])
+        self.assertEqual(wait_category('LCK_M_X'), 'lock')
+        self.assertEqual(wait_category('PAGEIOLATCH_SH'), 'io')
+
+    def testMiddleware(self):
+        from sqlserver_ado.waits import WaitStatsMiddleware
+        class Request(object):
+            pass
+        request, response = Request(), object()
+        middleware = WaitStatsMiddleware()
+        middleware.process_request(request)
+        list(Bug38Table.objects.all())
+        self.assertTrue(middleware.process_response(request, response) is response)
+        self.assertTrue(request.wait_stats.delta is not None)
+
+
+class TagSqlTestCase(TestCase):
+    def testTaggedBlocks(self):
+        from sqlserver_ado.tags import tag_sql, tagged
+        self.assertEqual(tag_sql('SELECT 1'), 'SELECT 1')
+        with tagged(view='app.views.index'):
+            with tagged(step='100%'):
+                self.assertEqual(tag_sql('SELECT 1'), '/* step=100%, view=app.views.index */ SELECT 1')
+                self.assertEqual(tag_sql('SELECT %s', [1]), '/* step=100%%, view=app.views.index */ SELECT %s')
+            self.assertEqual(tag_sql('SELECT 1'), '/* view=app.views.index */ SELECT 1')
+        self.assertEqual(tag_sql('SELECT 1'), 'SELECT 1')
+
+
+class NPlusOneTestCase(TestCase):
+    def testRepeatedSelectRaises(self):
+        from django.db import connection
+        from sqlserver_ado.nplusone import detect_n_plus_one, NPlusOneError
+
+        def run(times):
+            cursor = connection.cursor()
+            for i in range(times):
+                cursor.execute("SELECT %s", [i])
+                cursor.fetchall()
+
+        with detect_n_plus_one(threshold=3, raise_errors=True):
+            run(3)
+        detector = detect_n_plus_one(threshold=3, raise_errors=True)
+        detector.start()
+        run(4)
+        self.assertRaises(NPlusOneError, detector.finish)
+
+
+class ExplainTestCase(TestCase):
+    def testEstimatedPlan(self):
+        from sqlserver_ado.explain import explain
+        plans = explain(Bug38Table.objects.filter(d=decimal.Decimal('1.5')))
+        self.assertEqual(len(plans), 1)
+        self.assertTrue(plans[0].estimated_cost > 0)
+        self.assertTrue([node for node in plans[0].nodes() if node.physical_op])
+
+
+class WorkloadFileTestCase(TestCase):
+    def testRecordAndRead(self):
+        import os, tempfile
+        from sqlserver_ado.dbapi import Binary
+        from sqlserver_ado.stats import fingerprint_id
+        from sqlserver_ado.workload import WorkloadRecorder, read
+
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            recorder = WorkloadRecorder(path)
+            first, second = object(), object()
+            latin1 = 'SELECT \xe9 WHERE a = %s'
+            recorder.statement(first, 'execute', 'SELECT %s', [1], 10.0, 0.1, False)
+            recorder.statement(second, 'execute', 'SELECT %s', [2], 10.5, 0.1, True)
+            recorder.statement(second, 'execute', latin1, [3], 10.7, 0.1, False)
+            recorder.statement(second, 'execute', 'SELECT %s', [Binary('\x00\x01')], 10.8, 0.1, False)
+            recorder.transaction(first, 'commit', 11.0)
+            recorder.close()
+            select_id = fingerprint_id('SELECT %s')
+            sessions = read([path])
+            self.assertEqual(sessions, [
+                [('statement', 'execute', 'SELECT %s', select_id, (1,), 10.0), ('transaction', 'commit', 11.0)],
+                [('statement', 'execute', 'SELECT %s', select_id, (2,), 10.5),
+                    ('statement', 'execute', latin1, fingerprint_id(latin1), (3,), 10.7),
+                    ('statement', 'execute', 'SELECT %s', select_id, (Binary('\x00\x01'),), 10.8)],
+            ])
+            self.assertEqual(type(sessions[1][2][4][0]), buffer)
+        finally:
+            os.remove(path)
+
+    def testReplay(self):
+        import os, tempfile
+        from django.db import connection
+        from sqlserver_ado.base import make_connection_string
+        from sqlserver_ado.dbapi import Binary
+        from sqlserver_ado.stats import fingerprint_id
+        from sqlserver_ado.workload import WorkloadRecorder, replay
+
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            recorder = WorkloadRecorder(path)
+            session = object()
+            recorder.statement(session, 'execute', 'SELECT %s', [1], 10.0, 0.1, False)
+            recorder.statement(session, 'execute', 'SELECT DATALENGTH(%s)', [Binary('\x00\x01')], 10.1, 0.1, False)
+            recorder.transaction(session, 'commit', 10.2)
+            recorder.close()
+            report = replay([path], make_connection_string(connection.settings_dict), mode='fixed', concurrency=1)
+        finally:
+            os.remove(path)
+        self.assertEqual((report['sessions'], report['count'], report['errors']), (1, 2, 0))
+        self.assertEqual(sorted(report['statements']),
+            sorted([fingerprint_id('SELECT %s'), fingerprint_id('SELECT DATALENGTH(%s)')]))
+
+
+class DbbenchCommandTestCase(TransactionTestCase):
+    def testSmoke(self):
+        import json, sys
+        from StringIO import StringIO
+        from sqlserver_ado.sql_app.management.commands.dbbench import Command
+
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            Command().handle(database='default', threads=2, duration=0.5, rows=100,
+                mix='point=1,range=1,page=1,insert=1,many=1', keep=False)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        report = json.loads(output)
+        self.assertEqual(sorted(report['operations']), ['insert', 'many', 'page', 'point', 'range'])
+        self.assertEqual(sum([op['errors'] for op in report['operations'].values()]), 0)
+        self.assertTrue(sum([op['count'] for op in report['operations'].values()]) > 0)